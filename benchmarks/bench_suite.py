@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+"""Offline benchmark suite
+
+Benchmarks the framework against the local stand-in server and writes the
+results as JSON. With --baseline, results are compared to an earlier run and
+the suite exits with status 1 when a benchmark got slower than the allowed
+tolerance.
+
+Usage:
+    python3 benchmarks/bench_suite.py [--users N] [--todos N]
+        [--output FILE] [--baseline FILE] [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import runpy
+import sys
+import time
+from os.path import abspath, dirname, join
+
+ROOT = abspath(join(dirname(__file__), '../'))
+if not ROOT in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.stand_in_server import start_server
+from lib.common.reportlib import print_info, print_err
+from lib.common.utilitylib import compare_dicts, reconcile_records
+from lib.executors.restapilib import RestAPICall
+from lib.modules.rest import core_modules
+import testcases.rest.rest_constants as rest_constants
+
+CHECKER = join(ROOT, \
+    'testcases/rest/usecases/todos/fancode_task_completion_checker.py')
+
+
+def measure(func, number, repeat=3):
+    """Return best time per call of func in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence console reporting of the framework"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def run_checker(url):
+    """Run the FanCode task completion checker against url"""
+    rest_constants.fancode_url = url
+    try:
+        runpy.run_path(CHECKER, run_name='__main__')
+    except SystemExit:
+        pass
+
+
+def run_benchmarks(url, args):
+    """Run all benchmarks, return {name: seconds per call}"""
+    results = {}
+    number = args.number
+
+    with RestAPICall(url) as api, \
+            RestAPICall(url, transport='session') as session_api, \
+            RestAPICall(url, transport='session', \
+                compress_threshold=1024) as compress_api:
+        results['get_item_requests'] = measure(
+            lambda: api.get('/todos/1'), number)
+        results['get_item_session'] = measure(
+            lambda: session_api.get('/todos/1'), number)
+        results['get_list_json'] = measure(
+            lambda: session_api.get('/todos')['json_data'], \
+            max(1, number // 10))
+
+        payload = {'name': 'Bench User', 'username': 'bench_user'}
+        results['post_session'] = measure(
+            lambda: session_api.post('/users', dict(payload)), number)
+
+        # Large enough to be gzipped by compress_api
+        large_payload = dict(payload, todos=[{'title': f"Todo {index}", \
+            'completed': False} for index in range(100)])
+        results['post_large'] = measure(
+            lambda: session_api.post('/users', dict(large_payload)), number)
+        results['post_large_compressed'] = measure(
+            lambda: compress_api.post('/users', dict(large_payload)), number)
+
+        response = session_api.caller.get(url + '/todos', stream=False)
+        results['wrap_status_only'] = measure(
+            lambda: session_api._return_wrapped_up_data('GET', response, \
+                {})['status_code'], number * 10)
+        results['wrap_json_and_curl'] = measure(
+            lambda: [data['json_data'] and data['curl'] for data in \
+                [session_api._return_wrapped_up_data('GET', response, {})]], \
+            max(1, number // 10))
+
+        users = session_api.get('/users')['json_data']
+
+    with quiet():
+        results['users_from_fancode_city'] = measure(
+            lambda: core_modules.users_from_fancode_city(users), \
+            max(1, number // 10))
+
+    user = users[0]
+    other = json.loads(json.dumps(user))
+    results['compare_dicts'] = measure(
+        lambda: compare_dicts(user, other, 'user', 'other'), number * 10)
+    changed = json.loads(json.dumps(user))
+    changed['address']['geo']['lat'] = '0'
+    changed['name'] = ''
+    results['compare_dicts_mismatch'] = measure(
+        lambda: compare_dicts(user, changed, 'user', 'changed', \
+            ['address.geo']), number * 10)
+
+    actual = json.loads(json.dumps(users))
+    results['reconcile_records'] = measure(
+        lambda: reconcile_records(users, actual, ignore_keys=['address.geo']), \
+        max(1, number // 10))
+
+    with quiet():
+        results['checker_end_to_end'] = measure(
+            lambda: run_checker(url), 1)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000, \
+        help='Number of synthetic users')
+    parser.add_argument('--todos', type=int, default=20000, \
+        help='Number of synthetic todos')
+    parser.add_argument('--number', type=int, default=100, \
+        help='Calls per measurement of fast benchmarks')
+    parser.add_argument('--output', default='bench_output.json', \
+        help='Results file')
+    parser.add_argument('--baseline', help='Results file of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2, \
+        help='Allowed slowdown against the baseline (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    (server, url) = start_server(args.users, args.todos)
+    try:
+        results = run_benchmarks(url, args)
+    finally:
+        server.shutdown()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'users': args.users,
+        'todos': args.todos,
+        'results': {name: {'seconds': seconds, 'per_second': 1 / seconds} \
+            for name, seconds in results.items()},
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    regressions = []
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    for name, seconds in results.items():
+        line = f"{name}: {seconds * 1000:.3f} ms"
+        if name in baseline:
+            change = seconds / baseline[name]['seconds'] - 1
+            line += f" ({change:+.1%} vs baseline)"
+            if change > args.tolerance:
+                regressions.append(name)
+                print_err(line)
+                continue
+        print_info(line)
+
+    print_info(f"Results written to {args.output}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
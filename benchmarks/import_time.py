@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+"""Import-time benchmark
+
+Imports framework modules in fresh interpreters with `-X importtime` and
+checks the cumulative import time of every module against its budget.
+Exits with status 1 when a budget is exceeded.
+
+Usage:
+    python3 benchmarks/import_time.py [--repeat N] [--json FILE]
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from os.path import abspath, dirname, join
+
+ROOT = abspath(join(dirname(__file__), '../'))
+if not ROOT in sys.path:
+    sys.path.insert(0, ROOT)
+
+from lib.common.reportlib import print_info, print_err
+
+# Import time budget of each module in milliseconds
+BUDGETS = {
+    'lib.common.reportlib': 10,
+    'lib.common.utilitylib': 15,
+    'lib.executors.restapilib': 25,
+    'lib.modules.rest.core_modules': 20,
+    'lib.modules.rest.modules': 15,
+    'objects.rest.users.users_object': 30,
+    'objects.rest.todos.todos_object': 30,
+}
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def import_time(module):
+    """Return cumulative import time of a module in milliseconds
+
+    Only imports which the interpreter start-up didn't already do are
+    measured.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', \
+        f"import {module}"], cwd=ROOT, capture_output=True, text=True)
+    if process.returncode:
+        raise RuntimeError(f"Failed to import {module}:\n{process.stderr}")
+
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and not match.group(3) and match.group(4) == module:
+            return int(match.group(2)) / 1000
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, \
+        help='Runs per module, the fastest one is reported')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    over_budget = False
+    for module, budget in BUDGETS.items():
+        elapsed = min(import_time(module) for _ in range(args.repeat))
+        results[module] = {'ms': round(elapsed, 3), 'budget_ms': budget}
+        if elapsed > budget:
+            over_budget = True
+            print_err(f"{module}: {elapsed:.2f} ms (budget {budget} ms)")
+        else:
+            print_info(f"{module}: {elapsed:.2f} ms (budget {budget} ms)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+"""Local jsonplaceholder stand-in server
+
+Threaded HTTP server serving synthetic /users and /todos collections of
+configurable size, for benchmarks which must not depend on
+jsonplaceholder.typicode.com. Records are generated from their index on
+demand and list responses are streamed in chunks, so collections of
+millions of records are served without holding them in memory.
+
+Supported requests:
+    GET /users, GET /users/{id}, POST /users (gzip request bodies too)
+    GET /todos, GET /todos/{id}
+    Query params: userId and completed filters, _page/_limit pagination
+    (with X-Total-Count header)
+
+Usage:
+    python3 benchmarks/stand_in_server.py [--users N] [--todos N] [--port P]
+"""
+import argparse
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Records serialized per chunk of a list response
+CHUNK_RECORDS = 1000
+
+
+def _fraction(index, salt):
+    """Deterministic pseudo random number in [0, 1) for a record index"""
+    return ((index * 2654435761 + salt * 40503) % 4294967296) / 4294967296
+
+
+class SyntheticData(object):
+    """Synthetic users and todos, jsonplaceholder shaped
+
+    Todos belong to users in contiguous blocks, like on jsonplaceholder.
+    """
+
+    def __init__(self, users=10, todos=200):
+        self.users = users
+        self.todos = todos
+
+    def user(self, user_id):
+        lat = -90 + 180 * _fraction(user_id, 1)
+        lng = -180 + 360 * _fraction(user_id, 2)
+        return {
+            'id': user_id,
+            'name': f"User {user_id}",
+            'username': f"user_{user_id}",
+            'email': f"user_{user_id}@example.com",
+            'address': {
+                'street': f"{user_id} Main Street",
+                'suite': f"Apt. {user_id % 1000}",
+                'city': 'FanCode' if -40 <= lat <= 5 and 5 <= lng <= 100 \
+                    else 'Elsewhere',
+                'zipcode': f"{user_id % 100000:05d}",
+                'geo': {'lat': f"{lat:.4f}", 'lng': f"{lng:.4f}"},
+            },
+            'phone': f"1-770-{user_id % 10000:04d}",
+            'website': 'example.com',
+            'company': {
+                'name': f"Company {user_id % 100}",
+                'catchPhrase': 'Synthetic data',
+                'bs': 'benchmarks',
+            },
+        }
+
+    def todo_user(self, todo_id):
+        return (todo_id - 1) * self.users // self.todos + 1
+
+    def todo(self, todo_id):
+        return {
+            'userId': self.todo_user(todo_id),
+            'id': todo_id,
+            'title': f"Todo {todo_id}",
+            'completed': _fraction(todo_id, 3) < 0.6,
+        }
+
+    def todo_ids_of_user(self, user_id):
+        """Range of todo ids of a user"""
+        first = -(-(user_id - 1) * self.todos // self.users) + 1
+        last = -(-user_id * self.todos // self.users)
+        return range(max(first, 1), min(last, self.todos) + 1)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Request handler of the stand-in server"""
+    protocol_version = 'HTTP/1.1'
+    # Send responses in as few segments as possible, without Nagle delays on
+    # keep-alive connections
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_list(self, make_record, ids, total):
+        """Stream a JSON array of records with chunked encoding"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Total-Count', str(total))
+        self.end_headers()
+
+        def write_chunk(text):
+            data = text.encode()
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+        write_chunk('[')
+        batch = []
+        first = True
+        for record_id in ids:
+            batch.append(make_record(record_id))
+            if len(batch) == CHUNK_RECORDS:
+                write_chunk(('' if first else ', ') + \
+                    json.dumps(batch)[1:-1])
+                first = False
+                batch = []
+        if batch:
+            write_chunk(('' if first else ', ') + json.dumps(batch)[1:-1])
+        write_chunk(']')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_GET(self):
+        data = self.server.data
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in \
+            parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+
+        if parts[0] == 'users':
+            (make_record, count) = (data.user, data.users)
+            ids = range(1, count + 1)
+        elif parts[0] == 'todos':
+            (make_record, count) = (data.todo, data.todos)
+            ids = range(1, count + 1)
+            if 'userId' in query:
+                ids = data.todo_ids_of_user(int(query['userId']))
+        else:
+            return self._send_json(404, {})
+
+        if len(parts) == 2:
+            if parts[1].isdigit() and 1 <= int(parts[1]) <= count:
+                return self._send_json(200, make_record(int(parts[1])))
+            return self._send_json(404, {})
+
+        if 'completed' in query:
+            completed = query['completed'] == 'true'
+            ids = [record_id for record_id in ids \
+                if make_record(record_id)['completed'] == completed]
+
+        total = len(ids)
+        if '_limit' in query:
+            limit = int(query['_limit'])
+            page = int(query.get('_page', 1))
+            ids = ids[(page - 1) * limit:page * limit]
+
+        self._send_list(make_record, ids, total)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        encoding = self.headers.get('Content-Encoding', 'identity').lower()
+        try:
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding != 'identity':
+                return self._send_json(415, \
+                    {'message': f"Unsupported Content-Encoding {encoding}"})
+            payload = json.loads(body or b'{}')
+        except (OSError, EOFError, ValueError):
+            return self._send_json(400, {'message': 'Invalid JSON'})
+
+        if urlparse(self.path).path.strip('/') != 'users':
+            return self._send_json(404, {})
+        payload['id'] = self.server.data.users + 1
+        self._send_json(201, payload)
+
+
+def start_server(users=10, todos=200, port=0, host='127.0.0.1'):
+    """Start the stand-in server on a background thread
+
+    Args:
+        users: Number of users
+        todos: Number of todos
+        port: Port to listen on, 0 picks a free port
+        host: Address to listen on
+
+    Returns:
+        tuple: (server, base url), stop it with server.shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.data = SyntheticData(users, todos)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return (server, f"http://{host}:{server.server_port}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--todos', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StandInHandler)
+    server.daemon_threads = True
+    server.data = SyntheticData(args.users, args.todos)
+    print(f"Serving {args.users} users and {args.todos} todos on " \
+        f"http://127.0.0.1:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
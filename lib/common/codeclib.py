@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+"""
+..module:: codeclib
+
+JSON codec library
+
+JSON encoding and decoding through the fastest available backend: orjson,
+msgspec or the standard library json module. The backend is picked on first
+use, JSON_CODEC forces one.
+"""
+
+import functools
+import json
+import os
+
+# JSON backend: 'auto' - orjson, then msgspec, then json, or one of 'orjson',
+# 'msgspec', 'json'
+JSON_CODEC = os.getenv('JSON_CODEC', 'auto')
+
+# Backends tried by 'auto', in order of preference
+CODEC_PREFERENCE = ('orjson', 'msgspec', 'json')
+
+
+class _Codec(object):
+    """Encode and decode functions of a backend"""
+    __slots__ = ('name', 'loads', 'dumps', 'dumps_pretty')
+
+    def __init__(self, name, loads, dumps, dumps_pretty):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.dumps_pretty = dumps_pretty
+
+
+def _default(obj):
+    """Serialize objects with a to_dict() method (e.g. ResponseData) as dict
+    """
+    to_dict = getattr(obj, 'to_dict', None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON " \
+            "serializable")
+    return to_dict()
+
+
+def _pretty(obj):
+    """Indented JSON with sorted keys, the same for every backend"""
+    return json.dumps(obj, sort_keys=True, indent=4, default=_default)
+
+
+def _json_codec():
+    # Compact and unescaped like orjson and msgspec, the bytes sent don't
+    # depend on the backend
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, \
+            default=_default)
+    return _Codec('json', json.loads, dumps, _pretty)
+
+
+def _orjson_codec():
+    import orjson
+
+    def loads(data):
+        return orjson.loads(data)
+
+    # Non str keys are converted like the json module does it
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default, \
+            option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    # orjson only indents by 2, pretty output stays the json module's
+    return _Codec('orjson', loads, dumps, _pretty)
+
+
+def _msgspec_codec():
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+
+    def loads(data):
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as err:
+            # Raise ValueError like the other backends
+            raise ValueError(str(err)) from err
+
+    def dumps(obj):
+        try:
+            return encoder.encode(obj).decode('utf-8')
+        except msgspec.EncodeError as err:
+            # Raise TypeError like the other backends
+            raise TypeError(str(err)) from err
+
+    # msgspec doesn't sort keys
+    return _Codec('msgspec', loads, dumps, _pretty)
+
+
+_BACKENDS = {
+    'orjson': _orjson_codec,
+    'msgspec': _msgspec_codec,
+    'json': _json_codec,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_codec(name=None):
+    """Return codec of a backend, importing it on first use
+
+    Args:
+        name: Backend name, defaults to JSON_CODEC
+
+    Raises:
+        ValueError: If the backend is unknown
+        ImportError: If a forced backend isn't installed
+    """
+    name = JSON_CODEC if name is None else name
+    if name != 'auto':
+        if name not in _BACKENDS:
+            raise ValueError(f"Unknown JSON codec [{name}], use one of " \
+                f"{['auto'] + list(_BACKENDS)}")
+        return _BACKENDS[name]()
+
+    for name in CODEC_PREFERENCE:
+        try:
+            return _BACKENDS[name]()
+        except ImportError:
+            continue
+
+
+def loads(data):
+    """Decode a JSON document
+
+    Args:
+        data: bytes or str JSON document
+
+    Raises:
+        ValueError: If the document is not valid JSON
+    """
+    return get_codec().loads(data)
+
+
+def dumps(obj):
+    """Encode an object as compact JSON str, the same with every backend
+
+    Objects with a to_dict() method, like RestAPICall results, are encoded
+    as the dict it returns.
+
+    Raises:
+        TypeError: If the object isn't JSON serializable
+    """
+    return get_codec().dumps(obj)
+
+
+def dumps_pretty(obj):
+    """Encode an object as indented JSON str with sorted keys
+
+    Raises:
+        TypeError: If the object isn't JSON serializable
+    """
+    return get_codec().dumps_pretty(obj)
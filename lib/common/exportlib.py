@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+"""
+..module:: exportlib
+
+Exchange export library
+
+Sinks which append every REST API exchange (request and response) to a file
+for later reproduction. Exchanges are only referenced when they are recorded,
+formatting and writing happen in batches when the buffer is flushed.
+"""
+
+import atexit
+import json
+import threading
+from datetime import datetime, timezone
+
+from lib.common.utilitylib import generate_curl_cmd
+
+# Number of exchanges buffered before they are written to the file
+DEFAULT_BUFFER_SIZE = 100
+
+
+def _to_text(body):
+    """Return request/response body as text"""
+    if body is None:
+        return ''
+    if isinstance(body, bytes):
+        return body.decode('utf-8', errors='replace')
+    return str(body)
+
+
+class ExportSink(object):
+    """Base class of exchange export sinks
+
+    Subclasses implement _open(), _write(exchanges) and _close().
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE):
+        """Open the export file
+
+        Args:
+            path: Path of the export file
+            buffer_size: Number of exchanges buffered before writing
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8', buffering=1 << 16)
+        self._open()
+        atexit.register(self.close)
+
+    def record(self, response, payload=None):
+        """Record an exchange
+
+        Args:
+            response: requests Response object of the exchange
+            payload: Uncompressed request payload, exported instead of a
+                compressed request body
+        """
+        started = datetime.now(timezone.utc)
+        if response.elapsed:
+            started -= response.elapsed
+        with self._lock:
+            if self._file is None:
+                return
+            self._buffer.append((started, response, payload))
+            if len(self._buffer) >= self.buffer_size:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            exchanges, self._buffer = self._buffer, []
+            self._write(exchanges)
+
+    def flush(self):
+        """Write buffered exchanges to the file"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush()
+            self._file.flush()
+
+    def close(self):
+        """Write buffered exchanges and close the file"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush()
+            self._close()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self):
+        pass
+
+    def _close(self):
+        pass
+
+    def _write(self, exchanges):
+        raise NotImplementedError
+
+    @staticmethod
+    def _content(response):
+        """Return response body, None if it is (being) streamed to the caller
+
+        The body of a response whose stream isn't consumed yet is never read,
+        the caller may still be iterating over it.
+        """
+        if not getattr(response, '_content_consumed', False) or \
+                getattr(response, '_content', False) is False:
+            return None
+        return response.content
+
+    @staticmethod
+    def _exchange(started, response, payload=None):
+        """Return plain dict of an exchange
+
+        A compressed request body is replaced by the uncompressed payload and
+        its Content-Encoding and Content-Length headers are dropped, so the
+        exported request (and its curl command) can be sent again.
+        """
+        request = getattr(response, 'request', None)
+        method = getattr(request, 'method', None) or 'GET'
+        url = getattr(request, 'url', None) or response.url
+        request_headers = dict(request.headers) if request else {}
+        request_body = getattr(request, 'body', None)
+        if payload is not None and any(name.lower() == 'content-encoding' \
+                for name in request_headers):
+            request_headers = {name: value for name, value in \
+                request_headers.items() if name.lower() not in \
+                ('content-encoding', 'content-length')}
+            request_body = payload
+        return {
+            'started': started.isoformat(),
+            'time': response.elapsed.total_seconds() * 1000 \
+                if response.elapsed else 0,
+            'method': method,
+            'url': url,
+            'request_headers': request_headers,
+            'request_body': _to_text(request_body),
+            'status_code': response.status_code,
+            'reason': response.reason or '',
+            'response_headers': dict(response.headers),
+            'response_body': _to_text(ExportSink._content(response)),
+        }
+
+
+class JSONLinesSink(ExportSink):
+    """Writes one JSON object per exchange, with a curl command to replay it
+    """
+
+    def _write(self, exchanges):
+        lines = []
+        for started, response, payload in exchanges:
+            exchange = self._exchange(started, response, payload)
+            curl_data = {
+                'url': f"{exchange['method']} {exchange['url']}",
+                'input-headers': exchange['request_headers'],
+            }
+            if exchange['request_body']:
+                curl_data['payload'] = exchange['request_body']
+            exchange['curl'] = generate_curl_cmd(curl_data)
+            lines.append(json.dumps(exchange))
+        self._file.write('\n'.join(lines) + '\n')
+
+
+class HARSink(ExportSink):
+    """Writes exchanges as a HTTP Archive (HAR 1.2) file
+
+    The file is a valid HAR document once the sink is closed.
+    """
+
+    def _open(self):
+        self._entries = 0
+        self._file.write('{"log": {"version": "1.2", "creator": ' \
+            '{"name": "fancode_automate", "version": "1.0"}, "entries": [')
+
+    def _close(self):
+        self._file.write(']}}\n')
+
+    def _write(self, exchanges):
+        entries = []
+        for started, response, payload in exchanges:
+            exchange = self._exchange(started, response, payload)
+            request_headers = exchange['request_headers']
+            response_headers = exchange['response_headers']
+            entry = {
+                'startedDateTime': exchange['started'],
+                'time': exchange['time'],
+                'request': {
+                    'method': exchange['method'],
+                    'url': exchange['url'],
+                    'httpVersion': 'HTTP/1.1',
+                    'cookies': [],
+                    'headers': [{'name': name, 'value': value} \
+                        for name, value in request_headers.items()],
+                    'queryString': [],
+                    'headersSize': -1,
+                    'bodySize': len(exchange['request_body']),
+                },
+                'response': {
+                    'status': exchange['status_code'],
+                    'statusText': exchange['reason'],
+                    'httpVersion': 'HTTP/1.1',
+                    'cookies': [],
+                    'headers': [{'name': name, 'value': value} \
+                        for name, value in response_headers.items()],
+                    'content': {
+                        'size': len(exchange['response_body']),
+                        'mimeType': response_headers.get('Content-Type', ''),
+                        'text': exchange['response_body'],
+                    },
+                    'redirectURL': '',
+                    'headersSize': -1,
+                    'bodySize': len(exchange['response_body']),
+                },
+                'cache': {},
+                'timings': {'send': 0, 'wait': exchange['time'], \
+                    'receive': 0},
+            }
+            if exchange['request_body']:
+                entry['request']['postData'] = {
+                    'mimeType': request_headers.get('Content-Type', ''),
+                    'text': exchange['request_body'],
+                }
+            entries.append(json.dumps(entry))
+
+        if self._entries:
+            self._file.write(', ')
+        self._file.write(', '.join(entries))
+        self._entries += len(entries)
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+"""
+..module:: histogramlib
+
+Latency histogram library
+
+HDR style log-linear histogram. Values are counted in buckets whose width
+grows with the magnitude of the value, keeping a constant relative precision
+with a small, fixed memory footprint regardless of the number of recorded
+values.
+"""
+
+# Significant bits kept per value, 7 bits keeps relative error below 2%
+DEFAULT_PRECISION_BITS = 7
+
+
+class Histogram(object):
+    """Log-linear histogram of non-negative integer values (e.g. microseconds)
+    """
+
+    def __init__(self, precision_bits=DEFAULT_PRECISION_BITS):
+        """Create an empty histogram
+
+        Args:
+            precision_bits: Significant bits kept per value
+        """
+        self.bits = precision_bits
+        self._linear = 1 << precision_bits
+        self._half = 1 << (precision_bits - 1)
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        """Bucket index of a value"""
+        if value < self._linear:
+            return value
+        shift = value.bit_length() - self.bits
+        return (shift << (self.bits - 1)) + (value >> shift)
+
+    def _highest_value(self, index):
+        """Highest value counted in a bucket"""
+        if index < self._linear:
+            return index
+        shift = index // self._half - 1
+        mantissa = index - shift * self._half
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        """Record a value
+
+        Args:
+            value: Non-negative value, floats are truncated
+            count: Number of occurrences of the value
+        """
+        value = max(int(value), 0)
+        index = self._index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Add the values of another histogram of the same precision"""
+        if other.bits != self.bits:
+            raise ValueError("Histograms have different precision")
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def percentile(self, percentile):
+        """Value at a percentile
+
+        Args:
+            percentile: Percentile between 0 and 100
+
+        Returns:
+            Highest value of the bucket holding the percentile (never above
+            the recorded maximum), None if the histogram is empty
+        """
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * percentile // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest_value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        """Return dict of count, min, mean, max and percentiles"""
+        summary = {
+            'count': self.count,
+            'min': self.min,
+            'mean': self.mean,
+            'max': self.max,
+        }
+        for percentile in percentiles:
+            summary[f"p{percentile:g}".replace('.', '')] = \
+                self.percentile(percentile)
+        return summary
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+"""
+..module:: metricslib
+
+Metrics library
+
+Registry of per request counters and latency histograms, grouped by HTTP
+method and route template (e.g. GET /users/{id}), with pluggable hooks which
+are called for every observed request.
+"""
+
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+from lib.common.histogramlib import Histogram
+
+# Path segments replaced by {id} in route templates: numbers, UUIDs and long
+# hex ids
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-' \
+    r'[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{24,})$')
+
+
+@lru_cache(maxsize=4096)
+def route_template(uri):
+    """Return route template of an URI
+
+    Args:
+        uri: URI of a request, e.g. /users/5?x=1
+
+    Returns:
+        str: Route template, e.g. /users/{id}
+    """
+    path = uri.split('?', 1)[0]
+    return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment \
+        for segment in path.split('/'))
+
+
+class MetricsRegistry(object):
+    """Counters and histograms of REST API calls
+
+    Histograms record microseconds of every timing phase reported by
+    RestAPICall (ttfb, download, json_decode etc.).
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """Register hook(method, route, status_code, timings) called for every
+        observed request"""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Unregister a hook"""
+        self._hooks.remove(hook)
+
+    def _record(self, method, route, name, seconds):
+        key = (method, route, name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms.setdefault(key, Histogram())
+        histogram.record(seconds * 1e6)
+
+    def observe(self, method, uri, status_code, timings):
+        """Record a request
+
+        Args:
+            method: HTTP method
+            uri: URI of the request
+            status_code: Response status code
+            timings: Dict of timing phase to seconds (None if unknown)
+        """
+        route = route_template(uri)
+        with self._lock:
+            self.counters[(method, route, status_code)] += 1
+            for name, seconds in timings.items():
+                if seconds is not None:
+                    self._record(method, route, name, seconds)
+
+        for hook in self._hooks:
+            hook(method, route, status_code, timings)
+
+    def observe_timing(self, method, uri, name, seconds):
+        """Record a single timing phase measured after the request, e.g. a
+        lazy JSON decode"""
+        route = route_template(uri)
+        with self._lock:
+            self._record(method, route, name, seconds)
+
+    def snapshot(self):
+        """Return counters and histogram summaries (milliseconds) as dict"""
+        with self._lock:
+            requests = {}
+            for (method, route, status), count in self.counters.items():
+                requests.setdefault(f"{method} {route}", {})[str(status)] = \
+                    count
+
+            timings = {}
+            for (method, route, name), histogram in self.histograms.items():
+                timings.setdefault(f"{method} {route}", {})[name] = {
+                    key: (value / 1000 if value is not None and \
+                        key != 'count' else value) \
+                    for key, value in histogram.summary().items()}
+
+        return {'requests': requests, 'timings_ms': timings}
+
+    def reset(self):
+        """Drop all recorded metrics"""
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
@@ -7,9 +7,13 @@ Reporting Library
 This library includes all general and error reporting functions for objects and
 testcases.
 """
+import atexit
 import os
-import json
+import queue
 import sys
+import threading
+
+from lib.common import codeclib, resultlib
 
 # If DEBUG_FLAG is set to 1, the script will continue running despite the 
 # error.
@@ -17,6 +21,38 @@ import sys
 # indicate an error.
 DEBUG_FLAG = int(os.getenv('DEBUG_FLAG', 1))
 
+# CURL_MODE decides when module_report prints the curl command of a call.
+# 'always' - for every call, 'failure' - only for failed verifications,
+# 'never' - never. The command is rendered only when it is printed.
+CURL_MODE = os.getenv('CURL_MODE', 'always')
+
+# Severity of every print type
+LOG_LEVELS = {
+    'debug': 10,
+    'info': 20,
+    'curl': 20,
+    'warning': 30,
+    'error': 40,
+}
+
+# Messages below LOG_LEVEL are dropped before they are formatted.
+# print_pretty prints at debug level.
+LOG_LEVEL = LOG_LEVELS.get(os.getenv('LOG_LEVEL', 'debug').lower(), 10)
+
+# LOG_COLOR decides if tags are coloured. 'auto' - only when stdout is a
+# terminal, '1' - always, '0' - never.
+LOG_COLOR = os.getenv('LOG_COLOR', 'auto')
+
+# LOG_WRITER decides how text reaches stdout. 'sync' - written by the caller,
+# 'queue' - a background thread writes it so callers never block on stdout
+# I/O. Queued text is written after plain print() output of the caller
+# unless flush() is called first.
+LOG_WRITER = os.getenv('LOG_WRITER', 'sync')
+
+# If RESULT_FILE is set, module_report appends a JSON-lines record of every
+# verified operation to it. See lib/common/resultlib.py.
+RESULT_FILE = os.getenv('RESULT_FILE')
+
 beautify_dict = {
     # Green
     'info': "\033[92m[INFO] %s\033[0m\n",
@@ -30,17 +66,203 @@ beautify_dict = {
     'curl': "\033[34m[cURL] %s\033[0m\n"
 }
 
-def print_wrapper(print_type, text):
+plain_dict = {
+    'info': "[INFO] %s\n",
+    'error': "[ERROR] %s\n",
+    'debug': "[DEBUG] %s\n",
+    'warning': "[WARNING] %s\n",
+    'curl': "[cURL] %s\n"
+}
+
+
+class _QueueWriter(object):
+    """Writes text to its stream on a background thread
+
+    The stream is picked when text is queued, so redirections of sys.stdout
+    are respected.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, \
+                    name='reportlib-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            # Write everything queued meanwhile in one go
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            streams = []
+            for (stream, text) in items:
+                try:
+                    stream.write(text)
+                except (OSError, ValueError):
+                    # Stream was closed meanwhile, or is a broken pipe
+                    pass
+                if stream not in streams:
+                    streams.append(stream)
+            for stream in streams:
+                try:
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+            for _ in items:
+                self._queue.task_done()
+
+    def write(self, stream, text):
+        if self._thread is None:
+            self._start()
+        self._queue.put((stream, text))
+
+    def flush(self):
+        self._queue.join()
+
+
+class _SyncWriter(object):
+    """Writes text to its stream right away"""
+
+    def write(self, stream, text):
+        stream.write(text)
+
+    def flush(self):
+        sys.stdout.flush()
+
+
+_writer = _QueueWriter() if LOG_WRITER == 'queue' else _SyncWriter()
+atexit.register(_writer.flush)
+
+
+def _flushing_excepthook(hook):
+    """Wrap an excepthook to write queued text before the traceback"""
+    def excepthook(*args):
+        _writer.flush()
+        hook(*args)
+    return excepthook
+
+
+if LOG_WRITER == 'queue':
+    sys.excepthook = _flushing_excepthook(sys.excepthook)
+
+
+_result_sink = None
+
+
+def set_result_sink(sink):
+    """Set the sink module_report records results to
+
+    Args:
+        sink: resultlib.ResultSink, None to disable recording
+    """
+    global _result_sink
+    _result_sink = sink
+
+
+def get_result_sink():
+    """Return the result sink, opened from RESULT_FILE on first use"""
+    global _result_sink
+    if _result_sink is None and RESULT_FILE:
+        _result_sink = resultlib.ResultSink(RESULT_FILE)
+    return _result_sink
+
+
+def flush():
+    """Wait until all printed text and recorded results are written"""
+    if _result_sink is not None:
+        _result_sink.flush()
+    _writer.flush()
+
+
+def is_enabled(print_type):
+    """Check if text of a print type would be printed
+
+    Args:
+        print_type: Type of info
+    """
+    return LOG_LEVELS[print_type] >= LOG_LEVEL
+
+
+_is_tty = None
+
+
+def use_color():
+    """Check if tags should be coloured
+
+    The terminal check is done once, on first use.
+    """
+    global _is_tty
+    if LOG_COLOR != 'auto':
+        return LOG_COLOR not in ('0', 'false', 'no')
+    if _is_tty is None:
+        try:
+            _is_tty = sys.stdout.isatty()
+        except (AttributeError, ValueError):
+            _is_tty = False
+    return _is_tty
+
+
+def print_plain(text):
+    """Print text as is, regardless of log level
+
+    Args:
+        text: Text to be printed
+    """
+    _writer.write(sys.stdout, f"{text}\n")
+
+
+def _print(print_type, text):
+    """Format and print text, unless its print type is suppressed"""
+    if LOG_LEVELS[print_type] < LOG_LEVEL:
+        return
+    _writer.write(sys.stdout, print_wrapper(print_type, text) + '\n')
+
+
+def print_wrapper(print_type, text, color=None):
     """Print text with its print tag
 
     Args:
         print_type: Type of info
         text: Text to be printed
+        color: Flag determining if the tag is coloured, see use_color() when
+            None
     """
     if not text:
         text = ''
     else:
-        text = beautify_dict[print_type] % text
+        if color is None:
+            color = use_color()
+        tags = beautify_dict if color else plain_dict
+        text = tags[print_type] % text
+    return text
+
+
+def colorize(text):
+    """Colour tagged text returned with p=False, when tags are coloured
+
+    Returned text is never coloured, so that it can be recorded to result
+    files as is.
+
+    Args:
+        text: Text returned by a print function
+    """
+    if not isinstance(text, str) or not use_color():
+        return text
+    for (print_type, tag) in plain_dict.items():
+        (prefix, suffix) = tag.split('%s')
+        if text.startswith(prefix) and text.endswith(suffix):
+            return beautify_dict[print_type] % \
+                text[len(prefix):len(text) - len(suffix)]
     return text
 
 
@@ -50,11 +272,12 @@ def print_info(text, p=True):
     Args:
         text: Text to be printed
         p: Flag determining if text should be printed or returned
+            (uncoloured)
     """
     if p:
-        print((print_wrapper('info', text)))
+        _print('info', text)
     else:
-        return print_wrapper('info', text)
+        return print_wrapper('info', text, color=False)
 
 
 def print_err(text, p=True):
@@ -63,11 +286,12 @@ def print_err(text, p=True):
     Args:
         text: Text to be printed
         p: Flag determining if text should be printed or returned
+            (uncoloured)
     """
     if p:
-        print((print_wrapper('error', text)))
+        _print('error', text)
     else:
-        return print_wrapper('error', text)
+        return print_wrapper('error', text, color=False)
 
 
 def print_debug(text, p=True):
@@ -76,11 +300,12 @@ def print_debug(text, p=True):
     Args:
         text: Text to be printed
         p: Flag determining if text should be printed or returned
+            (uncoloured)
     """
     if p:
-        print((print_wrapper('debug', text)))
+        _print('debug', text)
     else:
-        return print_wrapper('debug', text)
+        return print_wrapper('debug', text, color=False)
 
 
 def print_warning(text, p=True):
@@ -89,11 +314,12 @@ def print_warning(text, p=True):
     Args:
         text: Text to be printed
         p: Flag determining if text should be printed or returned
+            (uncoloured)
     """
     if p:
-        print((print_wrapper('warning', text)))
+        _print('warning', text)
     else:
-        return print_wrapper('warning', text)
+        return print_wrapper('warning', text, color=False)
 
 
 def print_curl(text, p=True):
@@ -102,24 +328,51 @@ def print_curl(text, p=True):
     Args:
         text: curl command to be printed
         p: Flag determining if text should be printed or returned
+            (uncoloured)
     """
     if p:
-        print((print_wrapper('curl', text)))
+        _print('curl', text)
     else:
-        return print_wrapper('curl', text)
+        return print_wrapper('curl', text, color=False)
 
 
 def print_pretty(data, p=True):
     """Print dictionary with proper indentation
 
+    Printed at debug level, data isn't serialized when debug is suppressed.
+
     Args:
         data: Dictionary to be printed properly
         p: Flag determining if text should be printed or returned
     """
     if p:
-        print((json.dumps(data, sort_keys=True, indent=4)))
+        if is_enabled('debug'):
+            print_plain(codeclib.dumps_pretty(data))
     else:
-        return json.dumps(data, sort_keys=True, indent=4)
+        return codeclib.dumps_pretty(data)
+
+
+def _exit(status):
+    """Write pending text and exit"""
+    flush()
+    sys.exit(status)
+
+
+def report_curl(data):
+    """Print curl command of the rest api result data
+
+    Args:
+        data: Rest api result data
+    """
+    if not is_enabled('curl'):
+        # Don't render the command when it isn't printed
+        return
+    try:
+        print_curl(data['curl'])
+    except KeyError:
+        print_curl(data.get('command'))
+    except Exception:
+        pass
 
 
 def status_code_err():
@@ -146,28 +399,53 @@ def module_report(data, err, result, obj, obj_type, op_type, should_pass=True,
 
     """
 
-    try:
-        print_curl(data['curl'])
-    except KeyError:
-        print_curl(data.get('command'))
-    except Exception as e:
-        pass
+    failures = []
+
+    def report_result():
+        """Record the outcome once to the result sink"""
+        sink = get_result_sink()
+        if sink is None:
+            return
+        try:
+            status_code = data['status_code']
+        except Exception:
+            status_code = None
+        sink.record(op_type, obj_type, obj, \
+            'failed' if failures else 'passed', status_code, \
+            resultlib.latency_ms(data), '; '.join(failures) or None)
+
+    curl_reported = CURL_MODE == 'always'
+    if curl_reported:
+        report_curl(data)
+
+    def report_failure_curl():
+        """Print curl command once for a failed verification"""
+        nonlocal curl_reported
+        if CURL_MODE == 'failure' and not curl_reported:
+            report_curl(data)
+            curl_reported = True
 
     if result:
         if should_pass:
             print_info(f"{op_type.title()} operation on {obj_type} [{obj}] " \
                     "was successful.")
         else:
+            report_failure_curl()
+            failures.append('unprivileged operation was successful')
             print_err(f"Unpreviliged {op_type} operation on {obj_type} " \
                     f"[{obj}] was successful.")
             if not DEBUG_FLAG:
-                sys.exit(1)
+                report_result()
+                _exit(1)
     else:
         if should_pass:
+            report_failure_curl()
+            failures.append(str(err) if err else 'operation failed')
             print_err(f"Failed to {op_type} {obj_type} [{obj}].")
-            print(err)
+            print_plain(colorize(err))
             if not DEBUG_FLAG:
-                sys.exit(1)
+                report_result()
+                _exit(1)
 
         else:
             print_info(f"Failed to {op_type} {obj_type} [{obj}] " \
@@ -177,20 +455,27 @@ def module_report(data, err, result, obj, obj_type, op_type, should_pass=True,
                 # check for 500 status code
                 if not fail_status_code == 500 and \
                     int(data['status_code']) == 500:
+                    report_failure_curl()
+                    failures.append('failed with 500 status code')
                     print_err(f"Failed to {op_type} {obj_type} [{obj}]" \
                             "with 500 status code.")
                     if not DEBUG_FLAG:
-                        sys.exit(1)
+                        report_result()
+                        _exit(1)
 
                 # check for failed status code
                 if fail_status_code:
                     print_info(f"Verifying status code for {op_type} {obj_type}")
                     if not int(data['status_code']) == int(fail_status_code):
+                        report_failure_curl()
+                        failures.append(f"status code [{data['status_code']}]" \
+                            f" != [{fail_status_code}]")
                         print_err("Failed to verify status code.")
                         print_debug(f"Actual code: [{data['status_code']}]")
                         print_debug(f"Expected code: [{fail_status_code}]")
                         if not DEBUG_FLAG:
-                            sys.exit(1)
+                            report_result()
+                            _exit(1)
 
                     print_info(f"Status code [{fail_status_code}] verified.")
             except Exception:
@@ -212,10 +497,13 @@ def module_report(data, err, result, obj, obj_type, op_type, should_pass=True,
 
                 # when err_message value is None, key error
                 if not err_message:
+                    report_failure_curl()
+                    failures.append('no error message found')
                     print_err("No error message found.")
                     print_debug(data)
                     if not DEBUG_FLAG:
-                        sys.exit(1)
+                        report_result()
+                        _exit(1)
 
                 # if message is passed as list to check if err_message
                 # matches from any of the message from list
@@ -227,14 +515,20 @@ def module_report(data, err, result, obj, obj_type, op_type, should_pass=True,
                     if message not in err_message:
                         is_err_msg_matched = False
                 if not is_err_msg_matched:
+                    report_failure_curl()
+                    failures.append(f"error message [{err_message}] != " \
+                        f"[{message}]")
                     print_err("Error message is not correct. ")
                     print_debug(f"Actual message: [{err_message}]")
                     print_debug(f"Expected message: [{message}]")
                     if not DEBUG_FLAG:
-                        sys.exit(1)
+                        report_result()
+                        _exit(1)
 
                 print_info(f"Error message [{err_message}] verified.")
 
+    report_result()
+
 
 def count_err(new_count, expected_count):
     """Return count error
@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+"""
+..module:: resultlib
+
+Result Library
+
+Sink which appends the outcome of every module_report verification to a
+JSON-lines file as a compact record, and summaries aggregated from such files.
+Records are buffered and written in batches, each batch with a single write to
+a file opened for appending, so worker processes can share one file.
+"""
+
+import atexit
+import heapq
+import json
+import threading
+import time
+
+# Number of records buffered before they are written to the file
+DEFAULT_BUFFER_SIZE = 200
+
+# Number of slowest calls kept in a summary
+DEFAULT_SLOWEST = 10
+
+# Timing phases making up the latency of a call, connect is part of ttfb
+LATENCY_PHASES = ('prepare', 'ttfb', 'download')
+
+
+def latency_ms(data):
+    """Return latency of a rest api call in milliseconds
+
+    Args:
+        data: Rest api result data
+
+    Returns:
+        Latency, None if the call wasn't timed
+    """
+    try:
+        timings = data['timings']
+    except Exception:
+        return None
+    if not timings:
+        return None
+    return round(sum(timings.get(phase) or 0.0 \
+        for phase in LATENCY_PHASES) * 1000, 3)
+
+
+class ResultSink(object):
+    """Batched JSON-lines sink of module_report results"""
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE):
+        """Open the result file
+
+        Args:
+            path: Path of the result file, records are appended
+            buffer_size: Number of records buffered before writing
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        atexit.register(self.close)
+
+    def record(self, op_type, obj_type, obj, status, status_code=None, \
+        latency=None, error=None):
+        """Record the outcome of an operation
+
+        Args:
+            op_type: Operation type (LIST. GET, CREATE, DELETE etc)
+            obj_type: Resource type on which operation is done
+            obj: Actual object value
+            status: 'passed' or 'failed'
+            status_code: HTTP status code of the call
+            latency: Latency of the call in milliseconds
+            error: Error message of a failed operation
+        """
+        record = {
+            'ts': round(time.time(), 3),
+            'op': op_type,
+            'type': obj_type,
+            'obj': obj if isinstance(obj, (int, float)) else str(obj),
+            'status': status,
+            'code': status_code,
+            'ms': latency,
+        }
+        if error:
+            record['error'] = str(error)
+        with self._lock:
+            if self._file is None:
+                return
+            self._buffer.append(record)
+            if len(self._buffer) >= self.buffer_size:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            records, self._buffer = self._buffer, []
+            self._file.write(''.join(
+                json.dumps(record, separators=(',', ':'), default=str) + '\n'
+                for record in records))
+            self._file.flush()
+
+    def flush(self):
+        """Write buffered records to the file"""
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+
+    def close(self):
+        """Write buffered records and close the file"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def summarize(records, slowest=DEFAULT_SLOWEST):
+    """Aggregate result records
+
+    Args:
+        records: Iterable of result record dicts
+        slowest: Number of slowest calls to be kept
+
+    Returns:
+        Dict with total counts, counts per operation and status, and the
+        slowest calls
+    """
+    counts = {}
+    statuses = {}
+    slow = []
+    total = 0
+    for (index, record) in enumerate(records):
+        total += 1
+        status = record.get('status')
+        statuses[status] = statuses.get(status, 0) + 1
+        operation = counts.setdefault( \
+            f"{record.get('op')} {record.get('type')}", {})
+        operation[status] = operation.get(status, 0) + 1
+
+        latency = record.get('ms')
+        if latency is not None:
+            item = (latency, -index, record)
+            if len(slow) < slowest:
+                heapq.heappush(slow, item)
+            elif item > slow[0]:
+                heapq.heapreplace(slow, item)
+
+    return {
+        'total': total,
+        'status': statuses,
+        'operations': counts,
+        'slowest': [record for (_, _, record) in sorted(slow, reverse=True)],
+    }
+
+
+def read_records(path):
+    """Yield result records of a JSON-lines result file
+
+    Args:
+        path: Path of the result file
+    """
+    with open(path, encoding='utf-8') as result_file:
+        for line in result_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def summarize_file(path, slowest=DEFAULT_SLOWEST):
+    """Aggregate result records of a JSON-lines result file
+
+    Args:
+        path: Path of the result file
+        slowest: Number of slowest calls to be kept
+    """
+    return summarize(read_records(path), slowest)
@@ -7,13 +7,11 @@ Utility library
 This library contains general utility methods
 """
 
+import codecs
+import functools
 import json
-import sys
-from os.path import abspath, dirname, join
-
-if not abspath(join(dirname(__file__), '../../')) in sys.path:
-    sys.path.insert(0, abspath(join(dirname(__file__), '../../')))
 
+from lib.common import codeclib
 from lib.common.reportlib import print_err
 
 def generate_curl_cmd(response_dict):
@@ -35,6 +33,10 @@ def generate_curl_cmd(response_dict):
     header_cmd = ''
     try:
         for header, value in list(response_dict['input-headers'].items()):
+            if header.lower() == 'accept-encoding':
+                # Let curl negotiate and decode the response encoding
+                header_cmd += " --compressed"
+                continue
             header_cmd += " -H '%s: %s'" % (header, value)
     except Exception:
         header_cmd = ''
@@ -44,8 +46,7 @@ def generate_curl_cmd(response_dict):
         payload = response_dict['payload']
 
         if response_dict['input-headers']['Content-Type'] ==  'text/plain':
-            payload = json.dumps(payload, encoding="utf8",
-                                ensure_ascii=False).encode('utf8')
+            payload = codeclib.dumps(payload)
             payload_cmd = " -d $'%s' " % payload.strip('"')
         else:
             payload_cmd = " -d '%s' " % payload
@@ -59,43 +60,466 @@ def generate_curl_cmd(response_dict):
     return curl_cmd
 
 
+def run_flow(flow, target):
+    """Run a flow against the methods of an object
+
+    A flow is a generator yielding (method name, args) calls, which is sent
+    the result of every call (or thrown its exception) and returns its own
+    result. The same flow runs against blocking objects with run_flow() and
+    against asyncio ones with arun_flow().
+
+    Args:
+        flow: Flow generator
+        target: Object whose methods are called
+
+    Returns:
+        Result of the flow
+    """
+    (send, value) = (flow.send, None)
+    while True:
+        try:
+            (name, args) = send(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            (send, value) = (flow.send, getattr(target, name)(*args))
+        except Exception as err:
+            (send, value) = (flow.throw, err)
+
+
+async def arun_flow(flow, target):
+    """Run a flow against the coroutine methods of an object, see run_flow()
+    """
+    (send, value) = (flow.send, None)
+    while True:
+        try:
+            (name, args) = send(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            (send, value) = (flow.send, await getattr(target, name)(*args))
+        except Exception as err:
+            (send, value) = (flow.throw, err)
+
+
+def total_count_from_headers(headers, name='X-Total-Count'):
+    """Read total count of a collection from response headers
+
+    Args:
+        headers: Response headers dict
+        name: Name of the total count header (case insensitive)
+
+    Returns:
+        int or None: Total count, None if the header is missing or invalid
+    """
+    name = name.lower()
+    for header, value in headers.items():
+        if header.lower() == name:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def iter_pages(fetch_page, page_size, prefetch=True, first_page=1):
+    """Iterate over records of a paginated API
+
+    Only the current page (and the prefetched next one) is held in memory,
+    besides the previous one. Iteration stops at the first page without
+    exactly page_size records, once the total count is reached, or at a page
+    equal to the previous one, which isn't yielded. A server ignoring the
+    paging params thus yields its list once.
+
+    Args:
+        fetch_page: Function returning list of records of a page number, or
+            (records, total count) tuple, the total may be None if unknown
+        page_size: Number of records requested per page
+        prefetch: Fetch the next page in background while the records of the
+            current page are consumed
+        first_page: Number of the first page
+
+    Yields:
+        Records of all pages in order
+    """
+    executor = None
+    if prefetch:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        page = first_page
+        if executor:
+            future = executor.submit(fetch_page, page)
+
+        previous = None
+        total = None
+        count = 0
+        while True:
+            records = future.result() if executor else fetch_page(page)
+            if isinstance(records, tuple):
+                (records, page_total) = records
+                if page_total is not None:
+                    total = page_total
+            if records and records == previous:
+                # The paging params are ignored
+                return
+
+            count += len(records)
+            has_next = len(records) == page_size and \
+                (total is None or count < total)
+            if executor and has_next:
+                future = executor.submit(fetch_page, page + 1)
+
+            yield from records
+
+            if not has_next:
+                return
+            previous = records
+            page += 1
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# JSON whitespace
+_JSON_WHITESPACE = ' \t\n\r'
+
+# Characters which may follow a complete value inside a JSON array
+_JSON_VALUE_END = _JSON_WHITESPACE + ',]'
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """Decode a JSON array incrementally
+
+    Only the undecoded tail of the body is buffered, records are yielded as
+    soon as they are complete.
+
+    Args:
+        chunks: Iterable of bytes (or str) chunks of a JSON array document
+        encoding: Encoding of bytes chunks
+
+    Yields:
+        Values of the array in order
+
+    Raises:
+        ValueError: If the document is not a valid JSON array
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)(errors='strict')
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    eof = False
+    # What is expected next: '[' - start of the array, 'first' - first value
+    # or ']', 'value' - a value, 'separator' - ',' or ']', 'end' - nothing
+    # but whitespace
+    state = '['
+
+    def read():
+        """Append the next chunk to buffer, return False at end of body"""
+        nonlocal buf, pos, eof
+        for chunk in chunks:
+            if isinstance(chunk, bytes):
+                chunk = text_decoder.decode(chunk)
+            if chunk:
+                # Drop consumed part of the buffer
+                buf = buf[pos:] + chunk
+                pos = 0
+                return True
+        buf = buf[pos:] + text_decoder.decode(b'', final=True)
+        pos = 0
+        eof = True
+        return False
+
+    while True:
+        skip = _JSON_WHITESPACE + '\ufeff' if state == '[' \
+            else _JSON_WHITESPACE
+        while pos < len(buf) and buf[pos] in skip:
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                if state == 'end':
+                    return
+                raise ValueError("Incomplete JSON array")
+            read()
+            continue
+
+        char = buf[pos]
+        if state == '[':
+            if char != '[':
+                raise ValueError("JSON document is not an array")
+            state = 'first'
+            pos += 1
+            continue
+
+        if state == 'end':
+            raise ValueError(f"Extra data after JSON array at [{char!r}]")
+
+        if state == 'separator':
+            if char == ',':
+                state = 'value'
+            elif char == ']':
+                state = 'end'
+            else:
+                raise ValueError(f"Expected ',' or ']' in JSON array, got " \
+                    f"[{char!r}]")
+            pos += 1
+            continue
+
+        if char == ']' and state == 'first':
+            state = 'end'
+            pos += 1
+            continue
+
+        try:
+            (value, end) = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            read()
+            continue
+
+        # A value is complete only when a delimiter follows it, e.g. '1.'
+        # decodes as 1 until the rest of the number arrives
+        if end == len(buf) or buf[end] not in _JSON_VALUE_END:
+            if not eof:
+                read()
+                continue
+            if end < len(buf):
+                raise ValueError(f"Invalid JSON value in array at " \
+                    f"[{buf[pos:end + 1]!r}]")
+
+        pos = end
+        state = 'separator'
+        yield value
+
+
+# Placeholder of a missing key or list item in diffs
+MISSING = type('Missing', (), {'__repr__': lambda self: '<missing>'})()
+
+# Dotted ignore path segment matching any key or list index
+ANY_SEGMENT = '*'
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_ignore_paths(ignore_paths):
+    """Compile dotted ignore paths to a trie
+
+    Each node maps a path segment to its child node, a node of None ignores
+    the whole subtree.
+
+    Args:
+        ignore_paths: Tuple of dotted paths, e.g. ('id', 'address.geo',
+            'todos.*.id')
+
+    Returns:
+        Trie dict, empty if nothing is ignored
+    """
+    trie = {}
+    for path in ignore_paths:
+        node = trie
+        segments = str(path).split('.')
+        for segment in segments[:-1]:
+            child = node.get(segment, {})
+            if child is None:
+                # A parent path is ignored already
+                break
+            node = node.setdefault(segment, child)
+        else:
+            node[segments[-1]] = None
+    return trie
+
+
+def compile_ignore_paths(ignore_paths):
+    """Return compiled ignore paths for diff_values() and reconcile_records()
+
+    Args:
+        ignore_paths: Iterable of dotted paths, or an already compiled trie
+    """
+    if isinstance(ignore_paths, dict):
+        return ignore_paths
+    return _compile_ignore_paths(tuple(ignore_paths or ()))
+
+
+def _merge_ignore(trie1, trie2):
+    """Merge two ignore tries, an ignored subtree wins"""
+    merged = dict(trie1)
+    for segment, node in trie2.items():
+        if segment not in merged:
+            merged[segment] = node
+        elif merged[segment] is None or node is None:
+            merged[segment] = None
+        else:
+            merged[segment] = _merge_ignore(merged[segment], node)
+    return merged
+
+
+def _child_ignore(ignore, segment):
+    """Return ignore trie below a segment, None if the segment is ignored"""
+    exact = ignore.get(segment, {})
+    wildcard = ignore.get(ANY_SEGMENT, {})
+    if exact is None or wildcard is None:
+        return None
+    if not wildcard:
+        return exact
+    if not exact:
+        return wildcard
+    return _merge_ignore(exact, wildcard)
+
+
+def _diff(value1, value2, path, ignore, diffs):
+    """Append (path, value1, value2) of every mismatch below path to diffs"""
+    if value1 == value2:
+        # Equal values can't have mismatches, ignored paths or not
+        return
+
+    if isinstance(value1, dict) and isinstance(value2, dict):
+        keys = list(value1)
+        keys.extend(key for key in value2 if key not in value1)
+        for key in keys:
+            segment = str(key)
+            child = _child_ignore(ignore, segment) if ignore else ignore
+            if child is None:
+                continue
+            _diff(value1.get(key, MISSING), value2.get(key, MISSING), \
+                f"{path}.{segment}" if path else segment, child, diffs)
+    elif isinstance(value1, list) and isinstance(value2, list):
+        for index in range(max(len(value1), len(value2))):
+            segment = str(index)
+            child = _child_ignore(ignore, segment) if ignore else ignore
+            if child is None:
+                continue
+            _diff(value1[index] if index < len(value1) else MISSING, \
+                value2[index] if index < len(value2) else MISSING, \
+                f"{path}.{segment}" if path else segment, child, diffs)
+    else:
+        diffs.append((path, value1, value2))
+
+
+def diff_values(value1, value2, ignore_paths=()):
+    """Compare two nested values (dicts, lists and scalars) in one pass
+
+    Args:
+        value1: The first value
+        value2: The second value
+        ignore_paths: Dotted paths to ignore, '*' matches any key or list
+            index, e.g. ['id', 'address.geo', 'todos.*.id']
+
+    Returns:
+        list: (dotted path, value1, value2) tuple of every mismatch in key
+            order of value1 then value2, MISSING stands for a missing key or
+            list item. Empty if the values are equal.
+    """
+    diffs = []
+    _diff(value1, value2, '', compile_ignore_paths(ignore_paths), diffs)
+    return diffs
+
+
+def format_diffs(diffs, name1, name2):
+    """Format mismatches returned by diff_values()
+
+    Args:
+        diffs: List of (path, value1, value2) mismatches
+        name1: Name of the first value
+        name2: Name of the second value
+
+    Returns:
+        str: One line per mismatch
+    """
+    return '\n'.join(f"Mismatch at key '{path}', {name1}: {value1!r}, " \
+        f"{name2}: {value2!r}" for (path, value1, value2) in diffs)
+
+
 def compare_dicts(dict1, dict2, dict_1_name, dict_2_name, ignore_keys=[]):
-    """Compares two dictionaries.
+    """Compares two dictionaries recursively.
 
     Args:
         dict1 (dict): The first dictionary.
         dict2 (dict): The second dictionary.
         dict_1_name (str): Name of the dict1
         dict_2_name (str): Name of the dict2
-        ignore_keys (list): A list of keys to ignore during comparison.
+        ignore_keys (list): Keys to ignore during comparison, dotted paths
+            (e.g. 'address.geo') ignore nested keys.
 
     Returns:
         str or none: None if both dictionaries are equal, 
-            Error messages string otherwise.
+            Error messages string of all mismatches otherwise.
     """
     try:
-        # Remove ignored keys from both dictionaries
-        dict1_filtered = {key: value for key, value in dict1.items() if key \
-                        not in ignore_keys}
-        dict2_filtered = {key: value for key, value in dict2.items() if key \
-                        not in ignore_keys}
-
-        # Check if both dictionaries have the same keys
-        if dict1_filtered.keys() != dict2_filtered.keys():
-            key_err = "Keys missing in dictionaries. \n" \
-                f"{dict_1_name}: {dict1_filtered.keys()}\n" \
-                f"{dict_2_name}: {dict2_filtered.keys()}"
-            return print_err(key_err, p=False)
-
-        # Check if the values for each key are the same
-        for key in dict1_filtered:
-            if dict1_filtered[key] != dict2_filtered[key]:
-                value_err = f"Mismatch at key '{key}',\n " \
-                    f"{dict_1_name}: {dict1_filtered[key]},\n" \
-                    f"{dict_2_name}: {dict2_filtered[key]}"
-                return print_err(value_err, p=False)
-        
-        return None
+        diffs = diff_values(dict1, dict2, ignore_keys)
+        if not diffs:
+            return None
+        return print_err(format_diffs(diffs, dict_1_name, dict_2_name), \
+            p=False)
 
     except Exception as err:
         return print_err(err, p=False)
+
+
+def reconcile_records(expected, actual, key='id', ignore_keys=(), \
+    partial=False):
+    """Reconcile two record sets by key with a hash join
+
+    Args:
+        expected: Iterable of expected record dicts
+        actual: Iterable of actual record dicts, e.g. a list response
+        key: Key identifying a record
+        ignore_keys: Dotted paths to ignore while comparing matched records
+        partial: Expected records are a subset of actual ones, actual records
+            which aren't expected aren't reported
+
+    Returns:
+        dict: 'missing' - keys of expected records not found in actual,
+            'unexpected' - keys of actual records not expected,
+            'mismatched' - {key: diffs} of matched records which differ,
+            'matched' - number of matched records
+    """
+    ignore = compile_ignore_paths(ignore_keys)
+    index = {}
+    for record in actual:
+        index[record.get(key)] = record
+
+    missing = []
+    mismatched = {}
+    matched = 0
+    for record in expected:
+        record_key = record.get(key)
+        other = index.pop(record_key, MISSING)
+        if other is MISSING:
+            missing.append(record_key)
+            continue
+        matched += 1
+        diffs = []
+        _diff(record, other, '', ignore, diffs)
+        if diffs:
+            mismatched[record_key] = diffs
+
+    return {
+        'missing': missing,
+        'unexpected': [] if partial else list(index),
+        'mismatched': mismatched,
+        'matched': matched,
+    }
+
+
+def reconcile_err(reconciled, expected_name, actual_name):
+    """Return error message of reconcile_records() result, None if none
+
+    Args:
+        reconciled: Result of reconcile_records()
+        expected_name: Name of the expected record set
+        actual_name: Name of the actual record set
+    """
+    errors = []
+    if reconciled['missing']:
+        errors.append(f"Records missing in {actual_name}: " \
+            f"{reconciled['missing']}")
+    if reconciled['unexpected']:
+        errors.append(f"Records missing in {expected_name}: " \
+            f"{reconciled['unexpected']}")
+    for record_key, diffs in reconciled['mismatched'].items():
+        errors.append(f"Record [{record_key}]:\n" + \
+            format_diffs(diffs, expected_name, actual_name))
+    if not errors:
+        return None
+    return print_err('\n'.join(errors), p=False)
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""
+..module:: cachelib
+
+GET response cache
+
+Bounded (LRU) cache of wrapped up GET responses with per-route TTLs. Expired
+entries which carry ETag/Last-Modified validators are revalidated with a
+conditional request instead of being downloaded again.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Default number of cached responses
+DEFAULT_MAX_SIZE = 256
+
+# Default time to live of a cached response in seconds
+DEFAULT_TTL = 30
+
+
+class _CacheEntry(object):
+    """Cached response with its validators"""
+    __slots__ = ('url', 'data', 'expires', 'etag', 'last_modified')
+
+    def __init__(self, url, data, expires, etag, last_modified):
+        self.url = url
+        self.data = data
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ResponseCache(object):
+    """LRU cache of GET responses
+
+    Cached wrapped up data is never handed out, RestAPICall returns copies of
+    it (ResponseData.copy()) so callers can't modify each other's results.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL, \
+        route_ttls=None):
+        """Create a response cache
+
+        Args:
+            max_size: Maximum number of cached responses, least recently used
+                responses are evicted first
+            ttl: Default time to live of a response in seconds
+            route_ttls: Time to live per route, {uri prefix: seconds}. The
+                longest matching prefix wins, 0 disables caching of a route.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.route_ttls = sorted((route_ttls or {}).items(), \
+            key=lambda item: len(item[0]), reverse=True)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url, params=None, headers=None):
+        """Return cache key of a GET request"""
+        params = tuple(sorted((str(k), str(v)) for k, v in \
+            (params or {}).items()))
+        headers = tuple(sorted((str(k).lower(), str(v)) for k, v in \
+            (headers or {}).items()))
+        return (url, params, headers)
+
+    def ttl_for(self, uri):
+        """Return time to live of a route"""
+        for prefix, ttl in self.route_ttls:
+            if uri.startswith(prefix):
+                return ttl
+        return self.ttl
+
+    def lookup(self, key):
+        """Return (entry, fresh) for a key, entry is None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return (None, False)
+
+            self._entries.move_to_end(key)
+            fresh = time.monotonic() < entry.expires
+            if not fresh and not (entry.etag or entry.last_modified):
+                # Expired and can't be revalidated
+                del self._entries[key]
+                return (None, False)
+            return (entry, fresh)
+
+    def store(self, key, uri, data):
+        """Cache wrapped up data of a successful GET request
+
+        Args:
+            key: Cache key
+            uri: URI of the request, used to pick the route TTL
+            data: Wrapped up data of the response
+        """
+        ttl = self.ttl_for(uri)
+        if ttl <= 0:
+            return
+
+        headers = {name.lower(): value for name, value in \
+            data['headers'].items()}
+        entry = _CacheEntry(key[0], data, time.monotonic() + ttl, \
+            headers.get('etag'), headers.get('last-modified'))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key, uri):
+        """Restart time to live of a revalidated entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires = time.monotonic() + self.ttl_for(uri)
+
+    def invalidate(self, url):
+        """Drop cached responses of a URL and of everything below it
+
+        Args:
+            url: Collection or resource URL
+        """
+        below = url.rstrip('/') + '/'
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() \
+                    if entry.url == url or entry.url.startswith(below)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop all cached responses"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
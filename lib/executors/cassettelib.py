@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+"""
+..module:: cassettelib
+
+Record/replay cassettes
+
+A cassette keeps the responses of REST API calls on disk so that testcases
+and usecases can be replayed without any network I/O. It is made of two
+files:
+    <path> - append-only data file, one record per exchange: a header of
+        two little endian uint32 (meta length, body length), the response
+        meta data as JSON (status, reason, url, encoding, headers) and the
+        decoded response body
+    <path>.idx - index, one "<key> <offset>" line per record, the key is a
+        hash of method, URL, params and the canonical request payload
+
+Replay loads the index into a dict and memory-maps the data file. Calls with
+the same key are replayed in recorded order, the last one is repeated once
+they are used up, so e.g. a count read before and after a POST replays both
+counts.
+"""
+
+import atexit
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+# Cassette used by every RestAPICall when set, see default_cassette()
+CASSETTE = os.getenv('CASSETTE')
+
+# Mode of the CASSETTE cassette: 'auto' - replay if the cassette exists,
+# record otherwise, 'record', 'append' or 'replay'
+CASSETTE_MODE = os.getenv('CASSETTE_MODE', 'auto')
+
+# Header of a data file record: meta length, body length
+_RECORD_HEADER = struct.Struct('<II')
+
+# Response headers describing the wire format of the body, bodies are stored
+# decoded
+_WIRE_HEADERS = frozenset(('content-encoding', 'content-length', \
+    'transfer-encoding'))
+
+
+def exists(path):
+    """Check if a cassette (data file and index) exists"""
+    return os.path.exists(path) and os.path.exists(path + '.idx')
+
+
+class CassetteMissError(LookupError):
+    """A replayed call was not recorded"""
+
+
+def canonical_payload(payload):
+    """Return bytes identifying a logical request payload
+
+    JSON payloads (objects or JSON text) are serialized with sorted keys and
+    fixed separators, so the form doesn't depend on the JSON codec or the
+    formatting of the caller. Other payloads are used as they are.
+
+    Args:
+        payload: Uncompressed request payload, JSON serializable object, str
+            or bytes
+    """
+    if isinstance(payload, (str, bytes)):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return payload.encode('utf-8') if isinstance(payload, str) \
+                else payload
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), \
+        ensure_ascii=False, default=str).encode('utf-8')
+
+
+def exchange_key(method, url, params=None, payload=None):
+    """Return cassette key of a request
+
+    Args:
+        method: HTTP method
+        url: URL of the request
+        params: Query params
+        payload: Uncompressed request payload, see canonical_payload(). Not
+            the body sent, which depends on the codec and compression.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(method.upper().encode('utf-8'))
+    digest.update(b'\0' + url.encode('utf-8') + b'\0')
+    for (name, value) in sorted((str(name), str(value)) \
+            for name, value in (params or {}).items()):
+        digest.update(f"{name}={value}&".encode('utf-8'))
+    if payload not in (None, '', b''):
+        digest.update(b'\0')
+        digest.update(canonical_payload(payload))
+    return digest.hexdigest()
+
+
+class Cassette(object):
+    """Append-only, indexed store of recorded responses"""
+
+    def __init__(self, path, mode='auto'):
+        """Open a cassette
+
+        Args:
+            path: Path of the data file, the index is <path>.idx
+            mode: 'record' - start a new cassette and record every exchange,
+                'append' - record to the end of an existing cassette,
+                'replay' - serve responses from the cassette, 'auto' - replay
+                if the cassette exists, record otherwise
+        """
+        if mode == 'auto':
+            mode = 'replay' if exists(path) else 'record'
+        if mode not in ('record', 'append', 'replay'):
+            raise ValueError(f"Unknown cassette mode [{mode}]")
+
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        # {key: [offsets, next position]}
+        self._index = {}
+        self._data = None
+        self._map = None
+        self._index_file = None
+
+        if mode == 'replay':
+            self._load()
+        else:
+            # Unbuffered appends, every record and index line is a single
+            # write so several processes can append to one cassette
+            self._data = open(path, 'wb' if mode == 'record' else 'ab', \
+                buffering=0)
+            self._index_file = open(path + '.idx', \
+                'wb' if mode == 'record' else 'ab', buffering=0)
+        atexit.register(self.close)
+
+    @property
+    def recording(self):
+        return self.mode in ('record', 'append')
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def _load(self):
+        """Read the index and memory-map the data file"""
+        size = os.path.getsize(self.path)
+        with open(self.path + '.idx', encoding='utf-8') as index_file:
+            for line in index_file:
+                try:
+                    (key, offset) = line.split()
+                    offset = int(offset)
+                except ValueError:
+                    # Partially written line
+                    continue
+                if offset + _RECORD_HEADER.size <= size:
+                    self._index.setdefault(key, [[], 0])[0].append(offset)
+
+        if size:
+            with open(self.path, 'rb') as data_file:
+                self._map = mmap.mmap(data_file.fileno(), 0, \
+                    access=mmap.ACCESS_READ)
+
+    def record(self, key, response):
+        """Append the response of an exchange
+
+        Args:
+            key: exchange_key() of the request
+            response: requests Response object, its body is downloaded
+        """
+        meta = json.dumps({
+            'status': response.status_code,
+            'reason': response.reason,
+            'url': response.url,
+            'encoding': response.encoding,
+            'headers': {name: value for name, value in \
+                response.headers.items() if name.lower() not in _WIRE_HEADERS},
+        }, separators=(',', ':')).encode('utf-8')
+        body = response.content or b''
+
+        record = _RECORD_HEADER.pack(len(meta), len(body)) + meta + body
+
+        with self._lock:
+            if self._data is None:
+                return
+            self._data.write(record)
+            # Appended at the end of the file, wherever other writers left it
+            offset = self._data.tell() - len(record)
+            self._index_file.write(f"{key} {offset}\n".encode('utf-8'))
+            self._index.setdefault(key, [[], 0])[0].append(offset)
+
+    def lookup(self, key):
+        """Return (meta dict, body bytes) of the next recorded response
+
+        Raises:
+            CassetteMissError: If the key was not recorded
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or self._map is None:
+                raise CassetteMissError(key)
+            (offsets, position) = entry
+            offset = offsets[position]
+            if position + 1 < len(offsets):
+                entry[1] = position + 1
+
+        (meta_length, body_length) = _RECORD_HEADER.unpack_from(self._map, \
+            offset)
+        start = offset + _RECORD_HEADER.size
+        meta = json.loads(self._map[start:start + meta_length])
+        start += meta_length
+        return (meta, self._map[start:start + body_length])
+
+    def replay(self, method, url, params=None, body=None, headers=None, \
+        payload=None):
+        """Return the recorded response of a request
+
+        Args:
+            method: HTTP method
+            url: URL of the request
+            params: Query params
+            body: Request body as sent
+            headers: Request headers
+            payload: Uncompressed request payload the key is built from,
+                defaults to body
+
+        Returns:
+            requests Response object
+
+        Raises:
+            CassetteMissError: If the request was not recorded
+        """
+        try:
+            (meta, content) = self.lookup(exchange_key(method, url, params, \
+                body if payload is None else payload))
+        except CassetteMissError:
+            raise CassetteMissError(f"{method.upper()} {url} {params or ''}" \
+                f" is not recorded in cassette [{self.path}]") from None
+
+        import datetime
+        import requests
+        response = requests.models.Response()
+        response.status_code = meta['status']
+        response.reason = meta['reason']
+        response.url = meta['url']
+        response.encoding = meta['encoding']
+        response.headers = requests.structures.CaseInsensitiveDict( \
+            meta['headers'])
+        response._content = content
+        response._content_consumed = True
+        response.elapsed = datetime.timedelta(0)
+        response.request = requests.Request(method.upper(), url, \
+            params=params, data=body, headers=headers).prepare()
+        return response
+
+    def close(self):
+        """Flush a recorded cassette or unmap a replayed one"""
+        with self._lock:
+            if self._data is not None:
+                self._data.close()
+                self._index_file.close()
+                self._data = None
+                self._index_file = None
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        """Number of recorded keys"""
+        return len(self._index)
+
+
+_default_cassette = None
+_default_cassette_lock = threading.Lock()
+
+
+def default_cassette():
+    """Return the cassette named by CASSETTE, opened on first use"""
+    global _default_cassette
+    if CASSETTE is None:
+        return None
+    with _default_cassette_lock:
+        if _default_cassette is None:
+            _default_cassette = Cassette(CASSETTE, CASSETTE_MODE)
+    return _default_cassette
@@ -7,15 +7,604 @@ RESTful API wrapper interface
 This is the core library to handle HTTP interface using requests module.
 """
 
-import requests
-import json
-import sys
-from os.path import abspath, dirname, join
+import functools
+import os
+import threading
+import time
+from collections.abc import MutableMapping
 
-if not abspath(join(dirname(__file__), '../../')) in sys.path:
-    sys.path.insert(0, abspath(join(dirname(__file__), '../../')))
+from lib.common import codeclib
+from lib.common.utilitylib import generate_curl_cmd, iter_json_array
+from lib.executors.cachelib import ResponseCache
+
+# Default number of keep-alive connections kept per host by session transports
+DEFAULT_POOL_SIZE = 10
+
+# Default number of in-flight requests of an AsyncRestAPICall
+DEFAULT_CONCURRENCY = 50
+
+# Default gzip level of compressed request bodies
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Params of the single record page used to read the total count header of a
+# collection
+COUNT_PARAMS = {'_limit': 1}
+
+# Number of records per page of paginated iteration
+DEFAULT_PAGE_SIZE = 100
+
+
+def _requests():
+    """Import requests on first use
+
+    requests is the slowest import of the framework, code paths which never
+    make a call don't pay for it.
+    """
+    import requests
+    import requests.adapters
+    return requests
+
+
+# Seconds the current thread spent opening connections during a request
+_connect_timer = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def _timed_adapter_class():
+    """Return HTTPAdapter class whose connections time their connect()"""
+    requests = _requests()
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, \
+        HTTPSConnectionPool
+
+    def timed(connection_class):
+        class TimedConnection(connection_class):
+            def connect(self):
+                start = time.perf_counter()
+                try:
+                    super().connect()
+                finally:
+                    _connect_timer.seconds = getattr(_connect_timer, \
+                        'seconds', 0.0) + time.perf_counter() - start
+        return TimedConnection
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = timed(HTTPConnection)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = timed(HTTPSConnection)
+
+    class TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': TimedHTTPConnectionPool,
+                'https': TimedHTTPSConnectionPool,
+            }
+
+    return TimedHTTPAdapter
+
+
+def supported_encodings():
+    """Return response content encodings the transport can decode
+
+    gzip and deflate always, br and zstd when their decoder packages
+    (brotli/brotlicffi, zstandard) are installed.
+    """
+    from urllib3.util.request import ACCEPT_ENCODING
+    return [encoding.strip() for encoding in ACCEPT_ENCODING.split(',')]
+
+
+def accept_encoding_header(encodings):
+    """Return Accept-Encoding header value of a list of encodings
+
+    Args:
+        encodings: List (or comma separated str) of encodings. 'auto' for all
+            supported encodings, 'identity' to disable compression.
+
+    Raises:
+        ValueError: If an encoding can't be decoded by the transport
+    """
+    if isinstance(encodings, str):
+        if encodings == 'auto':
+            return ', '.join(supported_encodings())
+        encodings = [encoding.strip() for encoding in encodings.split(',')]
+
+    supported = set(supported_encodings()) | {'identity'}
+    unsupported = [encoding for encoding in encodings \
+        if encoding.split(';')[0].strip() not in supported]
+    if unsupported:
+        raise ValueError(f"Unsupported content encodings {unsupported}, " \
+            f"supported: {sorted(supported)}")
+    return ', '.join(encodings)
+
+
+# Sessions shared between RestAPICall objects, keyed by base url
+# {base_url: [session, reference count]}
+_shared_sessions = {}
+_shared_sessions_lock = threading.Lock()
+
+
+def new_session(pool_size=DEFAULT_POOL_SIZE):
+    """Create a keep-alive requests session with a bounded connection pool
+
+    Args:
+        pool_size: Maximum number of connections kept alive per host
+
+    Returns:
+        requests.Session object
+    """
+    requests = _requests()
+    session = requests.Session()
+    adapter = _timed_adapter_class()(pool_connections=pool_size, \
+        pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Connection': 'keep-alive'})
+    return session
+
+
+def acquire_shared_session(base_url, pool_size=DEFAULT_POOL_SIZE):
+    """Get the session shared by all callers of a base url
+
+    The session is created on first use. Every call must be paired with
+    release_shared_session().
+
+    Args:
+        base_url: URL of RESTful server
+        pool_size: Maximum number of connections kept alive per host, used
+            only when the session is created
+
+    Returns:
+        requests.Session object
+    """
+    with _shared_sessions_lock:
+        entry = _shared_sessions.get(base_url)
+        if entry is None:
+            entry = [new_session(pool_size), 0]
+            _shared_sessions[base_url] = entry
+        entry[1] += 1
+        return entry[0]
+
+
+def release_shared_session(base_url):
+    """Release the shared session of a base url
+
+    The session is closed once its last user releases it.
+
+    Args:
+        base_url: URL of RESTful server
+    """
+    with _shared_sessions_lock:
+        entry = _shared_sessions.get(base_url)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            entry[0].close()
+            del _shared_sessions[base_url]
+
+
+def close_shared_sessions():
+    """Close all shared sessions, including ones which weren't released"""
+    with _shared_sessions_lock:
+        sessions = [session for (session, _) in _shared_sessions.values()]
+        _shared_sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+# Size of body chunks read by streaming JSON decoding
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Content types whose body is kept as binary_data when it is not JSON
+BINARY_CONTENT_TYPES = frozenset(['application/octet-stream', \
+    'application/x-zip-compressed', 'application/gzip', 'application/pdf', \
+    'application/zip'])
+
+# Marks a value which is not decoded yet
+_UNSET = object()
+# Marks a key which is not present in the wrapper
+_ABSENT = object()
+
+
+def _copy_json(value):
+    """Copy the dicts and lists of a decoded JSON value"""
+    value_type = type(value)
+    if value_type is dict:
+        return {key: _copy_json(item) for key, item in value.items()}
+    if value_type is list:
+        return [_copy_json(item) for item in value]
+    return value
+
+
+class SingleFlight(object):
+    """Coalesces concurrent identical calls into a single one
+
+    The first caller of a key (the leader) makes the call, callers of the same
+    key arriving before it completes wait for its result instead.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Call func, or wait for the in-flight call of the same key
+
+        Args:
+            key: Hashable key of the call
+            func: Function making the call
+
+        Returns:
+            Tuple of the result and a flag telling if the result is shared
+            with other callers. Errors of the call are raised to all callers.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _FlightCall()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return (call.result, True)
+
+        try:
+            call.result = func()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return (call.result, call.waiters > 0)
+
+
+class _FlightCall(object):
+    """In-flight call of SingleFlight"""
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class ResponseData(MutableMapping):
+    """Wrapper dict over the response of a request
+
+    Behaves like the dict returned by RestAPICall, with keys:
+        url, status_code, input-headers, headers, cookies, payload (if any),
+        text_data and binary_data (if the body is not JSON), json_data, curl
+
+    Response headers, body decoding and the curl command are computed on first
+    access and cached, so callers which only check 'status_code' never pay
+    for them. Iterating over keys, len() and truth tests don't compute any
+    value. text_data and binary_data are only listed once the body is
+    decoded (e.g. by accessing json_data), key tests decode it. to_dict()
+    returns a plain dict of everything, codeclib serializes wrappers that
+    way.
+
+    'timings' holds seconds spent in each phase of the request:
+        connect - opening new connections (0 when a keep-alive connection was
+            reused, None when the transport can't tell)
+        prepare - building the request and getting it to the connection pool
+        ttfb - from sending the request to receiving response headers
+        download - reading the body
+        json_decode - decoding JSON, added on first access of json_data
+        wrap - wrapping up the response
+
+    'bytes' holds body sizes, None when unknown:
+        request, request_wire - request body before and after compression
+        response, response_wire - response body after and before decoding
+            of its content encoding
+    """
+    __slots__ = ('_method', '_response', '_input_headers', '_payload', \
+        '_cookies', '_headers', '_json', '_text', '_binary', '_curl', \
+        '_extra', '_timings', '_observer', '_source')
+
+    def __init__(self, method, response, input_headers, payload=None, \
+        cookies=None, timings=None, observer=None):
+        """Wrap a response
+
+        Args:
+            method: HTTP method.
+            response: requests Response object
+            input_headers: Headers sent with the request
+            payload: Input payload
+            cookies: Cookies of the session
+            timings: Dict of request phase timings in seconds
+            observer: Function(name, seconds) called with timings measured
+                after wrapping (JSON decode)
+        """
+        self._method = method
+        self._response = response
+        self._input_headers = input_headers
+        self._payload = payload if payload else _ABSENT
+        self._cookies = {} if cookies is None else cookies
+        self._headers = _UNSET
+        self._json = _UNSET
+        self._text = _UNSET
+        self._binary = _UNSET
+        self._curl = _UNSET
+        self._extra = None
+        self._timings = {} if timings is None else timings
+        self._observer = observer
+        self._source = None
+
+    def _decode(self):
+        """Decode the body as JSON, falling back to text and binary data"""
+        if self._source is not None:
+            # Copy of a shared response, copy the decoded body of the source
+            source = self._source
+            self._json = _copy_json(source['json_data'])
+            self._text = source._text
+            self._binary = source._binary
+            return
+
+        response = self._response
+        text_data = binary_data = _ABSENT
+        start = time.perf_counter()
+        try:
+            json_data = codeclib.loads(response.content)
+        except (ValueError, RuntimeError):
+            # No JSON object could be decoded
+            json_data = {}
+            try:
+                text_data = response.text
+            except (ValueError, RuntimeError):
+                pass
+
+            try:
+                if response.headers['Content-Type'] in BINARY_CONTENT_TYPES:
+                    binary_data = response.content
+            except (KeyError, RuntimeError):
+                pass
+
+        self._text = text_data
+        self._binary = binary_data
+        self._json = json_data
+
+        elapsed = time.perf_counter() - start
+        self._timings['json_decode'] = elapsed
+        if self._observer is not None:
+            self._observer('json_decode', elapsed)
+
+    def _get_url(self):
+        return ' '.join([self._method.upper(), self._response.url])
+
+    def _get_status_code(self):
+        return self._response.status_code
+
+    def _get_input_headers(self):
+        return self._input_headers
+
+    def _get_headers(self):
+        if self._headers is _UNSET:
+            self._headers = dict(self._response.headers)
+        return self._headers
+
+    def _get_cookies(self):
+        return self._cookies
+
+    def _get_payload(self):
+        return self._payload
+
+    def _get_text_data(self):
+        if self._json is _UNSET:
+            self._decode()
+        return self._text
+
+    def _get_binary_data(self):
+        if self._json is _UNSET:
+            self._decode()
+        return self._binary
+
+    def _get_json_data(self):
+        if self._json is _UNSET:
+            self._decode()
+        return self._json
+
+    def _get_curl(self):
+        if self._curl is _UNSET:
+            self._curl = generate_curl_cmd(self)
+        return self._curl
+
+    def _get_timings(self):
+        return self._timings
+
+    def _get_bytes(self):
+        response = self._response
+        request_body = getattr(response.request, 'body', None)
+        payload = self._payload
+        if payload is _ABSENT:
+            payload = request_body
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+
+        response_size = None
+        if getattr(response, '_content_consumed', False):
+            try:
+                response_size = len(response.content)
+            except RuntimeError:
+                # Streamed to the caller
+                pass
+        # urllib3 counts bytes read only for non chunked bodies, chunked ones
+        # are sized by Content-Length (if sent) or by the decoded body when
+        # it has no content encoding. None when the size is unknown.
+        try:
+            response_wire = response.raw.tell() or None
+        except Exception:
+            response_wire = None
+        if response_wire is None:
+            headers = response.headers
+            try:
+                response_wire = int(headers['Content-Length'])
+            except (KeyError, TypeError, ValueError):
+                if headers.get('Content-Encoding', 'identity') == 'identity':
+                    response_wire = response_size
+
+        return {
+            'request': len(payload) if payload else 0,
+            'request_wire': len(request_body) if request_body else 0,
+            'response': response_size,
+            'response_wire': response_wire,
+        }
+
+    # Keys which are only present if the body isn't JSON
+    _body_keys = ('text_data', 'binary_data')
+
+    # Key to getter mapping, in the key order of the wrapper dict
+    _getters = {
+        'url': _get_url,
+        'status_code': _get_status_code,
+        'input-headers': _get_input_headers,
+        'headers': _get_headers,
+        'cookies': _get_cookies,
+        'payload': _get_payload,
+        'text_data': _get_text_data,
+        'binary_data': _get_binary_data,
+        'json_data': _get_json_data,
+        'curl': _get_curl,
+        'timings': _get_timings,
+        'bytes': _get_bytes,
+    }
+
+    def __getitem__(self, key):
+        if self._extra is not None and key in self._extra:
+            value = self._extra[key]
+        else:
+            getter = self._getters.get(key)
+            if getter is None:
+                raise KeyError(key)
+            value = getter(self)
+
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key):
+        # Raise KeyError for missing keys
+        self[key]
+        self[key] = _ABSENT
+
+    def _decoded(self):
+        """Return wrapper holding the decoded body, None if not decoded yet"""
+        if self._json is not _UNSET:
+            return self
+        if self._source is not None and self._source._json is not _UNSET:
+            return self._source
+        return None
+
+    def __iter__(self):
+        extra = {} if self._extra is None else self._extra
+        for key in self._getters:
+            if key in extra:
+                if extra[key] is not _ABSENT:
+                    yield key
+            elif key == 'payload':
+                if self._payload is not _ABSENT:
+                    yield key
+            elif key not in self._body_keys:
+                yield key
+
+        # Checked after json_data, whose value decodes the body when items
+        # are iterated over
+        decoded = self._decoded()
+        if decoded is not None:
+            if 'text_data' not in extra and decoded._text is not _ABSENT:
+                yield 'text_data'
+            if 'binary_data' not in extra and decoded._binary is not _ABSENT:
+                yield 'binary_data'
+
+        for key, value in list(extra.items()):
+            if key not in self._getters and value is not _ABSENT:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        # Always has keys, don't count them
+        return True
+
+    def __contains__(self, key):
+        if self._extra is not None and key in self._extra:
+            return self._extra[key] is not _ABSENT
+        if key == 'payload':
+            return self._payload is not _ABSENT
+        if key in self._body_keys:
+            try:
+                self[key]
+            except KeyError:
+                return False
+            return True
+        return key in self._getters
+
+    def to_dict(self):
+        """Return a plain dict of all keys, computing every value"""
+        return {key: self[key] for key in self}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def iter_json(self, chunk_size=STREAM_CHUNK_SIZE):
+        """Iterate over the records of a JSON array body
+
+        Bodies of responses requested with stream=True are decoded chunk by
+        chunk without holding the whole body or array in memory. Already
+        decoded bodies are iterated from json_data.
+
+        Args:
+            chunk_size: Size of body chunks read from the connection
+
+        Yields:
+            Records of the JSON array
+        """
+        if self._json is not _UNSET or \
+            getattr(self._response, '_content_consumed', True):
+            yield from self['json_data']
+            return
+
+        try:
+            yield from iter_json_array(
+                self._response.iter_content(chunk_size),
+                self._response.encoding or 'utf-8')
+        finally:
+            self._response.close()
+
+    @property
+    def http_response(self):
+        """Underlying requests Response object"""
+        return self._response
+
+    def copy(self):
+        """Return an isolated copy sharing the response
+
+        The body is decoded once by this wrapper, a copy gets its own copy of
+        the decoded JSON on first access of json_data. This wrapper must not
+        be modified while copies are in use.
+        """
+        data = ResponseData(self._method, self._response, \
+            dict(self._input_headers), self._payload, self._cookies, \
+            dict(self._timings))
+        data._source = self if self._source is None else self._source
+        if self._extra is not None:
+            data._extra = dict(self._extra)
+        return data
 
-from lib.common.utilitylib import generate_curl_cmd
 
 class RestAPICall(object):
     """RESTful API Wrapper class
@@ -26,15 +615,295 @@ class RestAPICall(object):
         
         Args:
             base_url: URL of RESTful server.
+
+        Kwargs:
+            headers: Headers sent with every request
+            verify: SSL certificate verification flag
+            api_timeout: Default API timeout
+            transport: How requests are sent
+                'requests' - module level requests API, new connection for
+                    every call (default)
+                'session' - private keep-alive session with a connection pool
+                'shared' - keep-alive session shared by all RestAPICall
+                    objects with the same base url
+            pool_size: Keep-alive connections per host for session transports
+            session: Externally managed requests.Session to be used. It is
+                not closed by close().
+            export_sink: exportlib sink every exchange is recorded to
+            cache: cachelib.ResponseCache for GET responses. A POST
+                invalidates cached responses of its collection.
+            metrics: metricslib.MetricsRegistry recording counters and
+                timing histograms of every request
+            retry: retrylib.RetryPolicy retrying transient failures of
+                idempotent calls
+            hedge: retrylib.HedgePolicy sending a second GET when the first
+                one is slow, the first response wins
+            coalesce: Share one upstream call between concurrent identical
+                GETs (same URL, params and headers), each caller gets an
+                isolated copy of the response
+            accept_encoding: Response encodings to negotiate, list or comma
+                separated str ('auto' for all supported, 'identity' for
+                none). Defaults to the requests default.
+            compress_threshold: gzip request bodies of at least this many
+                bytes, None (default) never compresses
+            compress_level: gzip level of compressed request bodies
+            cassette: cassettelib.Cassette the exchanges are recorded to or
+                replayed from without network I/O. Defaults to the cassette
+                named by the CASSETTE environment variable, if any.
         """
         self.url = base_url
         self.headers = kwargs.get('headers', {})
         self.verify = kwargs.get('verify', False)
         self.api_timout = kwargs.get('api_timeout')
-        self.caller = requests
+        self.transport = kwargs.get('transport', 'requests')
+        self.pool_size = kwargs.get('pool_size', DEFAULT_POOL_SIZE)
+        self.export_sink = kwargs.get('export_sink')
+        self.cache = kwargs.get('cache')
+        self.metrics = kwargs.get('metrics')
+        self.retry = kwargs.get('retry')
+        self.hedge = kwargs.get('hedge')
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+        self.coalesce = kwargs.get('coalesce', False)
+        self.accept_encoding = kwargs.get('accept_encoding')
+        if self.accept_encoding is not None:
+            self.accept_encoding = accept_encoding_header( \
+                self.accept_encoding)
+        self.compress_threshold = kwargs.get('compress_threshold')
+        self.compress_level = kwargs.get('compress_level', \
+            DEFAULT_COMPRESS_LEVEL)
+        self.cassette = kwargs.get('cassette')
+        if self.cassette is None and os.getenv('CASSETTE'):
+            from lib.executors.cassettelib import default_cassette
+            self.cassette = default_cassette()
+        self._flights = SingleFlight()
+
+        self._caller = None
+        if kwargs.get('session') is not None:
+            self.transport = 'external'
+            self._caller = kwargs['session']
+        elif self.transport == 'session':
+            self._caller = new_session(self.pool_size)
+        elif self.transport == 'shared':
+            self._caller = acquire_shared_session(self.url, self.pool_size)
+        elif self.transport != 'requests':
+            raise ValueError(f"Unknown transport [{self.transport}]")
+
+    @property
+    def caller(self):
+        """requests module or session the calls are made with"""
+        if self._caller is None:
+            self._caller = _requests()
+        return self._caller
+
+    def close(self):
+        """Release connections held by the transport"""
+        with self._hedge_lock:
+            if self._hedge_executor is not None:
+                self._hedge_executor.shutdown(wait=False)
+                self._hedge_executor = None
+        if self.transport == 'session':
+            self._caller.close()
+        elif self.transport == 'shared':
+            release_shared_session(self.url)
+        self._caller = None
+        self.transport = 'requests'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
+    def _send(self, method, url, stream=False, payload=None, **kwargs):
+        """Send a request through the transport and time its phases
+
+        Args:
+            method: HTTP method (lower case name of the caller function)
+            url: URL of the request
+            stream: Leave the body on the connection
+            payload: Uncompressed request payload, replayed cassette
+                exchanges are looked up by it rather than by the body sent
+            kwargs: requests arguments
+
+        Returns:
+            Tuple of requests Response object and timings dict
+        """
+        if self.accept_encoding is not None:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, \
+                **{'Accept-Encoding': self.accept_encoding})
+
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            start = time.perf_counter()
+            response = cassette.replay(method, url, kwargs.get('params'), \
+                kwargs.get('data'), kwargs.get('headers'), payload)
+            return (response, {'connect': None, 'prepare': 0.0, 'ttfb': 0.0, \
+                'download': time.perf_counter() - start})
+
+        _connect_timer.seconds = 0.0
+        start = time.perf_counter()
+        response = getattr(self.caller, method)(url, stream=True, **kwargs)
+        headers_received = time.perf_counter()
+        if not stream or (cassette is not None and cassette.recording):
+            # Download the body, a recorded body is still iterable
+            response.content
+        ttfb = response.elapsed.total_seconds()
+
+        timings = {
+            'connect': _connect_timer.seconds \
+                if self.transport != 'requests' else None,
+            'prepare': max(headers_received - start - ttfb, 0.0),
+            'ttfb': ttfb,
+            'download': time.perf_counter() - headers_received,
+        }
+        return (response, timings)
+
+    def _call(self, method, url, stream=False, **kwargs):
+        """Send a request applying the hedge and retry policies
+
+        Args:
+            method: HTTP method (lower case name of the caller function)
+            url: URL of the request
+            stream: Leave the body on the connection
+            kwargs: requests arguments
+
+        Only the response returned is recorded to a recording cassette, not
+        failed attempts or lost hedges. Replayed calls aren't retried or
+        hedged, the cassette holds their outcome.
+
+        Returns:
+            Tuple of requests Response object and timings dict. Seconds
+            slept between retries are added as 'backoff' timing.
+        """
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            return self._send(method, url, stream, **kwargs)
+
+        (response, timings) = self._retried_call(method, url, stream, \
+            **kwargs)
+        if cassette is not None and cassette.recording:
+            from lib.executors.cassettelib import exchange_key
+            cassette.record(exchange_key(method, url, kwargs.get('params'), \
+                kwargs.get('payload')), response)
+        return (response, timings)
+
+    def _retried_call(self, method, url, stream=False, **kwargs):
+        """Send a request applying the hedge and retry policies, see _call()
+        """
+        retry = self.retry
+        hedged = self.hedge is not None and method == 'get' and not stream
+        if retry is not None:
+            retry.budget.deposit()
+        if hedged and (retry is None or self.hedge.budget is not retry.budget):
+            self.hedge.budget.deposit()
+
+        attempt = 0
+        backoff = 0.0
+        while True:
+            attempt += 1
+            error = None
+            try:
+                if hedged:
+                    (response, timings) = self._send_hedged(url, **kwargs)
+                else:
+                    (response, timings) = self._send(method, url, stream, \
+                        **kwargs)
+            except Exception as err:
+                if retry is None:
+                    raise
+                (response, timings, error) = (None, None, err)
+
+            if retry is None or \
+                    not retry.should_retry(method, attempt, response, error):
+                if error is not None:
+                    raise error
+                if backoff:
+                    timings['backoff'] = backoff
+                return (response, timings)
+
+            delay = retry.delay(attempt, response)
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            backoff += delay
+
+    def _hedge_pool(self):
+        """Return executor of hedged attempts, created on first use"""
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._hedge_executor = ThreadPoolExecutor( \
+                    max_workers=2 * self.pool_size, \
+                    thread_name_prefix='restapi-hedge')
+            return self._hedge_executor
+
+    def _send_hedged(self, url, **kwargs):
+        """Send a GET, and a hedge if it is slower than the hedge delay
+
+        The first successful attempt wins, the response of the other one is
+        closed when it completes.
+
+        Returns:
+            Tuple of requests Response object and timings dict. The delay
+            before a winning hedge is added as 'hedge' timing.
+        """
+        from concurrent.futures import wait, FIRST_COMPLETED, \
+            TimeoutError as FutureTimeoutError
+
+        executor = self._hedge_pool()
+        hedge = self.hedge
+
+        def settle(future):
+            """Observe latency of an attempt, close it if it lost"""
+            if future.exception() is not None:
+                return
+            (response, timings) = future.result()
+            hedge.observe(timings['prepare'] + timings['ttfb'] + \
+                timings['download'])
+            if getattr(future, 'lost', False):
+                response.close()
+
+        delay = hedge.delay()
+        first = executor.submit(self._send, 'get', url, **kwargs)
+        try:
+            first.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        except Exception:
+            # A failed first attempt isn't hedged, the retry policy handles it
+            pass
+        if first.done() or not hedge.should_hedge():
+            settle(first)
+            return first.result()
+
+        second = executor.submit(self._send, 'get', url, **kwargs)
+        pending = {first, second}
+        winner = None
+        while pending and winner is None:
+            (done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in (first, second):
+                if future in done and future.exception() is None:
+                    winner = future
+                    break
+
+        if winner is None:
+            # Both attempts failed
+            return first.result()
+
+        for future in (first, second):
+            if future is not winner:
+                future.lost = True
+                future.add_done_callback(settle)
+        settle(winner)
+        (response, timings) = winner.result()
+        if winner is second:
+            hedge.record_win()
+            timings['hedge'] = delay
+        return (response, timings)
+
     def _return_wrapped_up_data(self, method, response, headers={}, \
-        payload=None, content_type=None):
+        payload=None, content_type=None, timings=None, uri=None):
         """Return a wrapper over thhe response of a requests
 
         Args:
@@ -43,53 +912,35 @@ class RestAPICall(object):
             headers: Response headers from the HTTP request.
             payload: Input payload
             content_type: Content-Type
+            timings: Timings of the request phases
+            uri: URI of the request, used for metrics
 
         Returns:
-            Wrapper dict over the response.
-        """
-        response_dict = {
-            'url': ' '.join([method.upper(), response.url]),
-            'status_code': response.status_code,
-            'input-headers': headers,
-            'headers': dict(response.headers),
-            'cookies': self.caller.cookies if isinstance(self.caller, \
-                requests.sessions.Session) else {}
-        }
+            ResponseData wrapper dict over the response.
+        """
+        start = time.perf_counter()
         if content_type:
-            response_dict['input-headers'].\
-                update({'Content-Type': content_type})
-        if payload:
-            response_dict.update({'payload': payload})
-        
-        try:
-            json_data = response.json()
-        except (ValueError, RuntimeError):
-            # No JSON object could be decoded
-            json_data = {}
-            try:
-                text_data = response.text
-                response_dict.update({'text_data': text_data})
-            except (ValueError, RuntimeError):
-                pass
+            headers.update({'Content-Type': content_type})
+        cookies = self.caller.cookies if self.transport != 'requests' else {}
+        if self.export_sink is not None:
+            self.export_sink.record(response, payload)
 
-            try:
-                if response.headers['Content-Type'] in \
-                    ['application/octet-stream', \
-                    'application/x-zip-compressed', 'application/gzip', \
-                    'application/pdf', 'application/zip']:
-                    binary_data = response.content
-                    response_dict.update({'binary_data': binary_data})
-            except (KeyError, RuntimeError):
-                pass
-        response_dict.update({'json_data': json_data})
+        observer = None
+        if self.metrics is not None and uri is not None:
+            observer = functools.partial(self.metrics.observe_timing, \
+                method, uri)
+        data = ResponseData(method, response, headers, payload, cookies, \
+            timings, observer)
 
-        # Add curl command in data
-        curl = generate_curl_cmd(response_dict)
-        response_dict['curl'] = curl
-        return response_dict
+        if timings is not None:
+            timings['wrap'] = time.perf_counter() - start
+            if observer is not None:
+                self.metrics.observe(method, uri, response.status_code, \
+                    timings)
+        return data
     
     def get(self, uri, params=None, headers=None, content_type=None, \
-        timeout=None):
+        timeout=None, stream=False):
         """GET method
         
         Args:
@@ -98,11 +949,29 @@ class RestAPICall(object):
             headers: Headers for the HTTP request
             content_type: defaults to none for a get request
             timeout: API timout
+            stream: Don't download the body upfront, JSON array records can
+                then be decoded as they arrive with data.iter_json()
         
         Returns:
             Wrapper dict over the response of requests
         """
+        if self.coalesce and not stream:
+            # Identical GETs in flight share one upstream call, every caller
+            # gets its own copy of the response
+            key_headers = dict(headers or {})
+            key_headers.update(self.headers)
+            if content_type is not None:
+                key_headers['Content-Type'] = content_type
+            key = ResponseCache.key(self.url + uri, params, key_headers)
+            (data, shared) = self._flights.do(key, lambda: self._get(uri, \
+                params, headers, content_type, timeout))
+            return data.copy() if shared else data
 
+        return self._get(uri, params, headers, content_type, timeout, stream)
+
+    def _get(self, uri, params=None, headers=None, content_type=None, \
+        timeout=None, stream=False):
+        """GET method without coalescing, see get()"""
         url = self.url + uri
         timeout = self.api_timout if timeout is None else timeout
         headers = {} if headers is None else headers
@@ -112,11 +981,65 @@ class RestAPICall(object):
         if content_type is not None:
             headers.update({'Content-Type': content_type})
 
-        response = self.caller.get(url, headers=headers, verify=self.verify, \
-            params=params, timeout=timeout)
-        
-        return self._return_wrapped_up_data('GET', response, headers, \
-            content_type=content_type)
+        entry = None
+        send_headers = headers
+        if self.cache is not None and not stream:
+            cache_key = self.cache.key(url, params, headers)
+            (entry, fresh) = self.cache.lookup(cache_key)
+            if fresh:
+                # Every caller gets its own copy, cached data stays pristine
+                return entry.data.copy()
+
+            # Revalidate expired response, without touching caller's headers
+            if entry is not None:
+                send_headers = dict(headers)
+                if entry.etag:
+                    send_headers['If-None-Match'] = entry.etag
+                if entry.last_modified:
+                    send_headers['If-Modified-Since'] = entry.last_modified
+
+        (response, timings) = self._call('get', url, stream, \
+            headers=send_headers, verify=self.verify, params=params, \
+            timeout=timeout)
+
+        if entry is not None and response.status_code == 304:
+            response.close()
+            self.cache.refresh(cache_key, uri)
+            return entry.data.copy()
+
+        data = self._return_wrapped_up_data('GET', response, headers, \
+            content_type=content_type, timings=timings, uri=uri)
+
+        if self.cache is not None and not stream and \
+            data['status_code'] == 200:
+            self.cache.store(cache_key, uri, data)
+            return data.copy()
+
+        return data
+
+    def _compress(self, payload, headers):
+        """gzip a request body of at least compress_threshold bytes
+
+        Args:
+            payload: Request body
+            headers: Request headers
+
+        Returns:
+            Tuple of body and headers to be sent
+        """
+        if self.compress_threshold is None or \
+                not isinstance(payload, (str, bytes)):
+            return (payload, headers)
+        body = payload.encode('utf-8') if isinstance(payload, str) \
+            else payload
+        if len(body) < self.compress_threshold:
+            return (payload, headers)
+
+        import gzip
+        # mtime=0 keeps compressed bodies (and cassette keys) deterministic
+        body = gzip.compress(body, compresslevel=self.compress_level, \
+            mtime=0)
+        return (body, dict(headers, **{'Content-Encoding': 'gzip'}))
 
     def post(self, uri, payload=None, headers=None, params=None, \
              content_type='application/json', timeout=None):
@@ -146,9 +1069,93 @@ class RestAPICall(object):
             # For content type application/json payload must be in json format
             if isinstance(payload, (dict)):
                 if content_type == 'application/json':
-                    payload = json.dumps(payload)
-        response = self.caller.post(url, headers=headers, verify=self.verify, \
-            params=params, data=payload, timeout=timeout)
+                    payload = codeclib.dumps(payload)
+
+        # Input headers and payload stay uncompressed for reporting and curl
+        (body, send_headers) = self._compress(payload, headers)
+        (response, timings) = self._call('post', url, headers=send_headers, \
+            verify=self.verify, params=params, data=body, timeout=timeout, \
+            payload=payload)
+
+        if self.cache is not None:
+            self.cache.invalidate(url)
         
         return self._return_wrapped_up_data('POST', response, headers, \
-            payload, content_type)
+            payload, content_type, timings, uri)
+
+
+class AsyncRestAPICall(object):
+    """Asyncio RESTful API Wrapper class
+
+    Requests are executed by a pooled RestAPICall on a bounded set of worker
+    threads, so responses are wrapped up exactly as the blocking executor does
+    it while many calls can be awaited together on one event loop.
+    """
+
+    def __init__(self, base_url, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+        """Initialize asyncio RESTful api object
+
+        Args:
+            base_url: URL of RESTful server.
+            concurrency: Maximum number of requests in flight at a time
+            kwargs: RestAPICall options. Transport defaults to a private
+                session with one pooled connection per concurrent request.
+        """
+        kwargs.setdefault('transport', 'session')
+        kwargs.setdefault('pool_size', concurrency)
+        self.url = base_url
+        self.concurrency = concurrency
+        self.sync_api = RestAPICall(base_url, **kwargs)
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, \
+            thread_name_prefix='restapi')
+        self._semaphore = None
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking call on the worker pool within concurrency limit"""
+        import asyncio
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, \
+                functools.partial(func, *args, **kwargs))
+
+    async def get(self, uri, params=None, headers=None, content_type=None, \
+        timeout=None, stream=False):
+        """GET method, see RestAPICall.get
+
+        Returns:
+            Wrapper dict over the response of requests
+        """
+        return await self._run(self.sync_api.get, uri, params=params, \
+            headers=headers, content_type=content_type, timeout=timeout, \
+            stream=stream)
+
+    async def post(self, uri, payload=None, headers=None, params=None, \
+             content_type='application/json', timeout=None):
+        """POST method, see RestAPICall.post
+
+        Returns:
+            Wrapper dict over the response of requests
+        """
+        return await self._run(self.sync_api.post, uri, payload=payload, \
+            headers=headers, params=params, content_type=content_type, \
+            timeout=timeout)
+
+    def close(self):
+        """Stop worker threads and release connections"""
+        self._executor.shutdown(wait=True)
+        self.sync_api.close()
+
+    async def aclose(self):
+        """Close without blocking the event loop, see close"""
+        import asyncio
+        await asyncio.to_thread(self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
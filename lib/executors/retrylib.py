@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+"""
+..module:: retrylib
+
+Retry and hedging policies
+
+RetryPolicy retries failed idempotent calls with exponential backoff and full
+jitter, HedgePolicy sends a second GET when the first one is slower than a
+percentile of the observed latencies. Both spend from a RetryBudget, shared by
+default across all RestAPICall objects, which caps extra attempts to a ratio
+of the calls made, so retries and hedges can't multiply the load on a server
+which is already failing.
+"""
+
+import random
+import threading
+import time
+
+from lib.common.histogramlib import Histogram
+
+# Extra attempts allowed per call made within the budget window
+DEFAULT_BUDGET_RATIO = 0.1
+
+# Extra attempts per second allowed regardless of the ratio, lets low volume
+# callers retry at all
+DEFAULT_BUDGET_MIN_PER_SECOND = 10
+
+# Seconds calls and extra attempts are counted for
+DEFAULT_BUDGET_WINDOW = 10
+
+# Methods which can be sent again without side effects
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+# Status codes of transient server errors
+RETRY_STATUS_CODES = frozenset((429, 502, 503, 504))
+
+
+class RetryBudget(object):
+    """Sliding window budget of extra attempts (retries and hedges)
+
+    Every call deposits ratio of an attempt, every extra attempt withdraws a
+    whole one. Counts are kept in one bucket per second of the window.
+    """
+
+    def __init__(self, ratio=DEFAULT_BUDGET_RATIO, \
+        min_per_second=DEFAULT_BUDGET_MIN_PER_SECOND, \
+        window=DEFAULT_BUDGET_WINDOW):
+        """Create a retry budget
+
+        Args:
+            ratio: Extra attempts allowed per call
+            min_per_second: Extra attempts per second always allowed
+            window: Seconds calls and extra attempts are counted for
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = int(window)
+        # [second, calls, extra attempts] per second of the window
+        self._buckets = [[0, 0, 0] for _ in range(self.window)]
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def _bucket(self, now):
+        second = int(now)
+        bucket = self._buckets[second % self.window]
+        if bucket[0] != second:
+            bucket[:] = [second, 0, 0]
+        return bucket
+
+    def _totals(self, now):
+        oldest = int(now) - self.window
+        calls = extra = 0
+        for (second, bucket_calls, bucket_extra) in self._buckets:
+            if second > oldest:
+                calls += bucket_calls
+                extra += bucket_extra
+        return (calls, extra)
+
+    def deposit(self):
+        """Count a call"""
+        with self._lock:
+            self._bucket(time.monotonic())[1] += 1
+
+    def withdraw(self):
+        """Take an extra attempt from the budget
+
+        Returns:
+            bool: True if the attempt may be made
+        """
+        now = time.monotonic()
+        with self._lock:
+            (calls, extra) = self._totals(now)
+            allowed = self.min_per_second * self.window + self.ratio * calls
+            if extra + 1 > allowed:
+                self.exhausted += 1
+                return False
+            self._bucket(now)[2] += 1
+            return True
+
+    def reset(self):
+        """Forget counted calls and extra attempts"""
+        with self._lock:
+            self._buckets = [[0, 0, 0] for _ in range(self.window)]
+            self.exhausted = 0
+
+
+# Budget shared by policies which aren't given one
+DEFAULT_BUDGET = RetryBudget()
+
+
+class RetryPolicy(object):
+    """Retries of transient failures with exponential backoff and jitter"""
+
+    def __init__(self, max_attempts=3, backoff=0.1, max_backoff=2.0, \
+        methods=IDEMPOTENT_METHODS, status_codes=RETRY_STATUS_CODES, \
+        budget=None):
+        """Create a retry policy
+
+        Args:
+            max_attempts: Attempts per call, including the first one
+            backoff: Backoff before the first retry in seconds, doubled for
+                every further retry
+            max_backoff: Longest backoff in seconds
+            methods: HTTP methods which are retried
+            status_codes: Response status codes which are retried
+            budget: RetryBudget, defaults to the shared DEFAULT_BUDGET
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.methods = frozenset(method.upper() for method in methods)
+        self.status_codes = frozenset(status_codes)
+        self.budget = DEFAULT_BUDGET if budget is None else budget
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def is_retryable(self, method, response=None, error=None):
+        """Check if an attempt failed transiently
+
+        Args:
+            method: HTTP method
+            response: requests Response object of the attempt
+            error: Exception raised by the attempt
+        """
+        if method.upper() not in self.methods:
+            return False
+        if error is not None:
+            from requests.exceptions import ConnectionError, Timeout
+            return isinstance(error, (ConnectionError, Timeout))
+        return response is not None and \
+            response.status_code in self.status_codes
+
+    def should_retry(self, method, attempt, response=None, error=None):
+        """Check if a call is attempted again, withdraws from the budget
+
+        Args:
+            method: HTTP method
+            attempt: Number of attempts made so far
+            response: requests Response object of the last attempt
+            error: Exception raised by the last attempt
+        """
+        if attempt >= self.max_attempts or \
+                not self.is_retryable(method, response, error):
+            return False
+        if not self.budget.withdraw():
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def delay(self, attempt, response=None):
+        """Return seconds to wait before the next attempt
+
+        Full jitter, uniformly random up to the exponential backoff. A
+        Retry-After header (in seconds) is respected up to max_backoff.
+
+        Args:
+            attempt: Number of attempts made so far
+            response: requests Response object of the last attempt
+        """
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        delay = random.uniform(0, ceiling)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                retry_after = None
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+
+class HedgePolicy(object):
+    """Hedged GETs, a second attempt when the first one is slow
+
+    The hedge delay is a percentile of the latencies observed by the policy,
+    initial_delay until min_samples latencies are observed.
+    """
+
+    def __init__(self, percentile=95, initial_delay=0.1, min_delay=0.005, \
+        max_delay=2.0, min_samples=20, budget=None):
+        """Create a hedge policy
+
+        Args:
+            percentile: Percentile of observed latencies a hedge is sent after
+            initial_delay: Hedge delay in seconds until enough latencies are
+                observed
+            min_delay: Shortest hedge delay in seconds
+            max_delay: Longest hedge delay in seconds
+            min_samples: Latencies observed before the percentile is used
+            budget: RetryBudget, defaults to the shared DEFAULT_BUDGET
+        """
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.budget = DEFAULT_BUDGET if budget is None else budget
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = Histogram()
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Record latency of a completed attempt"""
+        with self._lock:
+            self._latencies.record(seconds * 1e6)
+
+    def delay(self):
+        """Return seconds to wait before sending a hedge"""
+        with self._lock:
+            if self._latencies.count < self.min_samples:
+                return self.initial_delay
+            delay = self._latencies.percentile(self.percentile) / 1e6
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    def should_hedge(self):
+        """Check if a hedge is sent, withdraws from the budget"""
+        if not self.budget.withdraw():
+            return False
+        with self._lock:
+            self.hedges += 1
+        return True
+
+    def record_win(self):
+        """Count a hedge which completed before the first attempt"""
+        with self._lock:
+            self.hedge_wins += 1
@@ -5,14 +5,36 @@ REST data manipulation and filtering.
 
 """
 import sys
-from os.path import abspath, dirname, join
-
-if not abspath(join(dirname(__file__), '../../../')) in sys.path:
-    sys.path.insert(0, abspath(join(dirname(__file__), '../../../')))
+from collections import Counter
+from functools import lru_cache
+from operator import itemgetter
 
 from lib.common.reportlib import print_info, print_err, print_debug
 
-def users_from_fancode_city(users):
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """Import numpy on first use
+
+    numpy is optional and slow to import, pure python paths are used without
+    it.
+
+    Returns:
+        numpy module, None if it is not installed
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+# Bounding box of the city FanCode, (min, max) of latitude and longitude
+FANCODE_BOUNDING_BOX = {
+    'lat': (-40, 5),
+    'lng': (5, 100),
+}
+
+def users_from_fancode_city(users, bounding_box=None):
     """
     Filters list of users to return only those who belong to the city FanCode.
     
@@ -20,26 +42,78 @@ def users_from_fancode_city(users):
     latitude is between -40 and 5 and longitude is between 5 and 100.
 
     Args:
-        users: A list of user dictionaries where each user contains 
-            'lat' and 'lng' keys representing their geographical coordinates.
+        users: A list (or any iterable, e.g. Users.stream_users()) of user 
+            dictionaries where each user contains 'lat' and 'lng' keys 
+            representing their geographical coordinates.
+        bounding_box: {'lat': (min, max), 'lng': (min, max)} of the city,
+            defaults to FANCODE_BOUNDING_BOX. To filter the same users by
+            many bounding boxes, convert them once with geo_columns().
     
     Returns:
         List: A list of user dictionaries filtered to include only those from 
             the city 'FanCode'.
     """
     print_debug("Filtering FanCode users from the list...")
+    bounding_box = FANCODE_BOUNDING_BOX if bounding_box is None \
+        else bounding_box
+    (lat_min, lat_max) = bounding_box['lat']
+    (lng_min, lng_max) = bounding_box['lng']
     result = list()
     for user in users:
         lat = user['address']['geo']['lat']
         lng = user['address']['geo']['lng']
 
         # Check if the user is in the specified latitude and longitude range
-        if -40 <= float(lat) <= 5 and 5 <= float(lng) <= 100:
+        if lat_min <= float(lat) <= lat_max and \
+            lng_min <= float(lng) <= lng_max:
             result.append(user)
 
     return result
 
 
+def geo_columns(users):
+    """Convert coordinates of users to latitude and longitude arrays
+
+    Reading coordinates out of the user dictionaries costs about as much as
+    one users_from_fancode_city() pass. It pays off when the same users are
+    filtered by several bounding boxes with bounding_box_mask(), which takes
+    about a millisecond per 200k users. Requires numpy.
+
+    Args:
+        users: List of user dictionaries
+
+    Returns:
+        tuple: (lat, lng) numpy float arrays in user order
+    """
+    numpy = _numpy()
+    if numpy is None:
+        raise ImportError("numpy is required for coordinate arrays")
+    geos = list(map(itemgetter('geo'), map(itemgetter('address'), users)))
+    lat = numpy.fromiter(map(float, map(itemgetter('lat'), geos)), float, \
+        count=len(geos))
+    lng = numpy.fromiter(map(float, map(itemgetter('lng'), geos)), float, \
+        count=len(geos))
+    return (lat, lng)
+
+
+def bounding_box_mask(lat, lng, bounding_box):
+    """Return mask of coordinates inside a bounding box
+
+    Args:
+        lat: numpy array of latitudes
+        lng: numpy array of longitudes
+        bounding_box: {'lat': (min, max), 'lng': (min, max)}
+
+    Returns:
+        numpy bool array, users of geo_columns() inside the bounding box are
+            e.g. [users[i] for i in numpy.flatnonzero(mask)]
+    """
+    (lat_min, lat_max) = bounding_box['lat']
+    (lng_min, lng_max) = bounding_box['lng']
+    return (lat >= lat_min) & (lat <= lat_max) & \
+        (lng >= lng_min) & (lng <= lng_max)
+
+
 def calculate_user_task_completion_percentage(todos_api, user_id):
     """Calculates the percentage of completed todo tasks for a user.
     Args:
@@ -74,3 +148,226 @@ def calculate_user_task_completion_percentage(todos_api, user_id):
     print_info(f"Completion percentage for user {user_id}: {percentage:.2f}%")
 
     return percentage
+
+
+def _completion_percentage(user_id, total_tasks, completed_tasks):
+    """Report task counts of a user and return the completion percentage.
+    Returns None if there are no tasks.
+    """
+    print_info(f"Total tasks for user {user_id}: {total_tasks}")
+
+    if not total_tasks:
+        print_err(f"No tasks found for user {user_id}.")
+        return None
+
+    print_info(f"Completed tasks for user {user_id}: {completed_tasks}")
+
+    percentage = int((completed_tasks / total_tasks) * 100)
+    print_info(f"Completion percentage for user {user_id}: {percentage:.2f}%")
+
+    return percentage
+
+
+def calculate_users_task_completion_percentage(todos_api, user_ids):
+    """Calculates the percentage of completed todo tasks for many users with
+    a single list todos request.
+
+    Total and completed counters of every user are built in one pass over
+    the todos, verdicts are the same as of
+    calculate_user_task_completion_percentage.
+
+    Args:
+        todos_api: an instance of todo api
+        user_ids: ids of the users
+
+    Returns:
+        dict: user id to percentage of completed tasks as returned by
+            calculate_user_task_completion_percentage.
+    """
+    print_debug(f"Calculating completion percentage for users - {user_ids}")
+    (data, err, result) = todos_api.list_todos()
+    if not result:
+        print_err("Failed to list todos.")
+        print_debug(err)
+        sys.exit(1)
+
+    aggregator = TodoCompletionAggregator()
+    aggregator.add_todos(data['json_data'])
+
+    return {user_id: _completion_percentage(user_id, \
+            *aggregator.counts(user_id)) for user_id in user_ids}
+
+
+def todo_batch_arrays(todos):
+    """Convert a batch of todos to compact userId and completed arrays
+
+    Args:
+        todos: List of todo dictionaries
+
+    Returns:
+        tuple: (user_ids, completed) numpy arrays, or lists without numpy
+    """
+    user_ids = list(map(itemgetter('userId'), todos))
+    completed = list(map(bool, map(itemgetter('completed'), todos)))
+    numpy = _numpy()
+    if numpy is None:
+        return (user_ids, completed)
+    return (_id_array(user_ids), numpy.array(completed, dtype=bool))
+
+
+def _id_array(user_ids):
+    """Return numpy array of user ids, object array unless they're numbers"""
+    numpy = _numpy()
+    if isinstance(user_ids, numpy.ndarray) and user_ids.dtype.kind in 'iuf':
+        return user_ids
+    try:
+        array = numpy.asarray(user_ids)
+    except (TypeError, ValueError, OverflowError):
+        array = None
+    if array is None or array.dtype.kind not in 'iuf':
+        # Strings, ints beyond int64, mixed types, kept as they are
+        array = numpy.empty(len(user_ids), dtype=object)
+        array[:] = list(user_ids)
+    return array
+
+
+class TodoCompletionAggregator(object):
+    """Per-user todo completion counters of all users
+
+    Batches of todos are counted with numpy.bincount (collections.Counter
+    without numpy), so completion of every user is computed without a per
+    user loop and batches can be added as pages stream in. User ids are
+    mapped to compact counter slots first, so any ids (sparse, huge,
+    negative or not even integers) cost one slot per distinct user.
+    """
+
+    def __init__(self):
+        numpy = _numpy()
+        self.vectorized = numpy is not None
+        if not self.vectorized:
+            self._total = Counter()
+            self._completed = Counter()
+        else:
+            # {user id: counter slot}
+            self._slots = {}
+            self._total = numpy.zeros(0, dtype=numpy.int64)
+            self._completed = numpy.zeros(0, dtype=numpy.int64)
+
+    def _slot(self, user_id):
+        """Return counter slot of a user id, new ids get the next slot"""
+        return self._slots.setdefault(user_id, len(self._slots))
+
+    def _batch_slots(self, user_ids):
+        """Return array of counter slots of a batch of user ids"""
+        numpy = _numpy()
+        if user_ids.dtype.kind in 'iu':
+            low = int(user_ids.min())
+            span = int(user_ids.max()) - low + 1
+            if span <= 4 * len(user_ids) + 1024:
+                # Dense enough to find distinct ids without sorting, the
+                # lookup table is as small as the batch
+                offsets = user_ids - low
+                present = numpy.flatnonzero(numpy.bincount(offsets, \
+                    minlength=span))
+                lookup = numpy.zeros(span, dtype=numpy.int64)
+                lookup[present] = numpy.fromiter(map(self._slot, \
+                    (present + low).tolist()), numpy.int64, \
+                    count=len(present))
+                return lookup[offsets]
+        try:
+            (unique, inverse) = numpy.unique(user_ids, return_inverse=True)
+        except TypeError:
+            # Unorderable ids of mixed types, mapped one by one
+            return numpy.fromiter(map(self._slot, user_ids.tolist()), \
+                numpy.int64, count=len(user_ids))
+        slots = numpy.fromiter(map(self._slot, unique.tolist()), \
+            numpy.int64, count=len(unique))
+        return slots[inverse.reshape(-1)]
+
+    def _grow(self, size):
+        """Extend numpy counters to hold size slots"""
+        if size > len(self._total):
+            numpy = _numpy()
+            pad = size - len(self._total)
+            self._total = numpy.concatenate(
+                [self._total, numpy.zeros(pad, dtype=numpy.int64)])
+            self._completed = numpy.concatenate(
+                [self._completed, numpy.zeros(pad, dtype=numpy.int64)])
+
+    def add_arrays(self, user_ids, completed):
+        """Count a batch of todos
+
+        Args:
+            user_ids: Array of userId of todos
+            completed: Array of completed flags of todos
+        """
+        if not self.vectorized:
+            self._total.update(user_ids)
+            self._completed.update(user_id for (user_id, done) in \
+                zip(user_ids, completed) if done)
+            return
+
+        numpy = _numpy()
+        user_ids = _id_array(user_ids)
+        completed = numpy.asarray(completed, dtype=bool)
+        if not len(user_ids):
+            return
+
+        slots = self._batch_slots(user_ids)
+        size = len(self._slots)
+        self._grow(size)
+        self._total += numpy.bincount(slots, minlength=size)
+        self._completed += numpy.bincount(slots[completed], minlength=size)
+
+    def add_todos(self, todos):
+        """Count a batch of todo dictionaries"""
+        self.add_arrays(*todo_batch_arrays(todos))
+
+    def add_batches(self, batches):
+        """Count an iterable of (user_ids, completed) array batches"""
+        for (user_ids, completed) in batches:
+            self.add_arrays(user_ids, completed)
+        return self
+
+    def counts(self, user_id):
+        """Return (total, completed) todos of a user"""
+        if not self.vectorized:
+            return (self._total[user_id], self._completed[user_id])
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return (0, 0)
+        return (int(self._total[slot]), int(self._completed[slot]))
+
+    def results(self):
+        """Return completion of all users with todos
+
+        Returns:
+            dict: user id to (total, completed, percentage) in order of first
+                appearance, percentage is computed as by
+                calculate_user_task_completion_percentage
+        """
+        if not self.vectorized:
+            return {user_id: (total, self._completed[user_id], \
+                int((self._completed[user_id] / total) * 100)) \
+                for user_id, total in self._total.items() if total}
+
+        # Every slot was given to a user with todos, totals aren't 0
+        numpy = _numpy()
+        percentage = ((self._completed / self._total) * 100) \
+            .astype(numpy.int64)
+        return {user_id: (t, c, p) for (user_id, t, c, p) in zip(
+            self._slots, self._total.tolist(), self._completed.tolist(), \
+            percentage.tolist())}
+
+
+def aggregate_todo_completion(batches):
+    """Aggregate per-user todo completion of an iterable of batches
+
+    Args:
+        batches: Iterable of (user_ids, completed) arrays, see
+            todo_batch_arrays()
+
+    Returns:
+        TodoCompletionAggregator with all batches counted
+    """
+    return TodoCompletionAggregator().add_batches(batches)
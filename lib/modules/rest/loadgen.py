@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+"""
+..module:: Load generator built on the Users/Todos object layer
+
+Replays weighted scenarios at a target request rate (open loop) or with a
+fixed number of concurrent workers (closed loop) for a given duration, and
+reports latency percentiles, throughput and errors per status code.
+
+Usage:
+    python3 -m lib.modules.rest.loadgen --url URL --duration 30
+        --concurrency 20 [--rps 200] [--scenario get_user=5 ...]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from lib.common.histogramlib import Histogram
+from lib.common.reportlib import print_info, print_err
+from objects.rest.users.users_object import Users
+from objects.rest.todos.todos_object import Todos
+
+# Scenario weights used when none are given
+DEFAULT_WEIGHTS = {
+    'list_users': 1,
+    'get_user': 4,
+    'create_user': 1,
+    'list_todos': 1,
+    'get_todo': 4,
+}
+
+
+def _user_payload(rng):
+    """Random user payload for create_user"""
+    suffix = rng.randrange(10 ** 9)
+    return {
+        'name': f"Load User {suffix}",
+        'username': f"load_user_{suffix}",
+        'email': f"load_user_{suffix}@example.com",
+        'address': {
+            'street': 'Load street',
+            'suite': 'Apt. 1',
+            'city': 'FanCode',
+            'zipcode': '00000',
+            'geo': {'lat': '-10.0000', 'lng': '50.0000'},
+        },
+        'phone': '1-000-000-0000',
+        'website': 'example.com',
+        'company': {'name': 'Load', 'catchPhrase': 'Load', 'bs': 'load'},
+    }
+
+
+# Scenario name to function(generator, rng) returning (data, err, result)
+SCENARIOS = {
+    'list_users': lambda gen, rng: gen.users_api.list_users(),
+    'get_user': lambda gen, rng: gen.users_api.get_user(
+        rng.randint(*gen.user_ids)),
+    'create_user': lambda gen, rng: gen.users_api.create_user(
+        _user_payload(rng), verify=False, verify_count=False),
+    'list_todos': lambda gen, rng: gen.todos_api.list_todos(),
+    'get_todo': lambda gen, rng: gen.todos_api.get_todo(
+        rng.randint(*gen.todo_ids)),
+}
+
+
+class _WorkerStats(object):
+    """Results of one worker, merged at the end of the run"""
+
+    def __init__(self):
+        self.latency = {}
+        self.statuses = {}
+
+    def record(self, scenario, latency_us, status):
+        histogram = self.latency.get(scenario)
+        if histogram is None:
+            histogram = self.latency[scenario] = Histogram()
+            self.statuses[scenario] = Counter()
+        histogram.record(latency_us)
+        self.statuses[scenario][status] += 1
+
+
+class LoadGenerator(object):
+    """Drives weighted Users/Todos scenarios against an API
+    """
+
+    def __init__(self, url, weights=None, rps=None, concurrency=10, \
+        duration=10, user_ids=(1, 10), todo_ids=(1, 200), seed=None, \
+        **kwargs):
+        """Configure a load run
+
+        Args:
+            url: The base URL of the API.
+            weights: {scenario: weight}, defaults to DEFAULT_WEIGHTS
+            rps: Target requests per second over all workers. None runs
+                closed loop, every worker sends its next request as soon as
+                the previous one finished.
+            concurrency: Number of worker threads (and pooled connections)
+            duration: Run time in seconds
+            user_ids: (first, last) user ids used by get_user
+            todo_ids: (first, last) todo ids used by get_todo
+            seed: Random seed of scenario selection
+            kwargs: RestAPICall options of the objects
+        """
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        unknown = set(weights) - set(SCENARIOS)
+        if unknown:
+            raise ValueError(f"Unknown scenarios {sorted(unknown)}")
+
+        self.url = url
+        self.scenarios = [name for name in weights if weights[name] > 0]
+        self.weights = [weights[name] for name in self.scenarios]
+        self.rps = rps
+        self.concurrency = concurrency
+        self.duration = duration
+        self.user_ids = user_ids
+        self.todo_ids = todo_ids
+        self.seed = seed
+        kwargs.setdefault('transport', 'shared')
+        kwargs.setdefault('pool_size', concurrency)
+        self.api_kwargs = kwargs
+
+    def _worker(self, index, start, stats):
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        deadline = start + self.duration
+        # Open loop: every worker sends at its share of the target rate and
+        # latency is measured from the scheduled send time, so a slow server
+        # can't hide queueing delay (coordinated omission).
+        interval = self.concurrency / self.rps if self.rps else 0
+        scheduled = start + interval * index / self.concurrency
+
+        while True:
+            if interval:
+                now = time.perf_counter()
+                if scheduled > now:
+                    time.sleep(scheduled - now)
+                sent = scheduled
+                scheduled += interval
+            else:
+                sent = time.perf_counter()
+            if sent >= deadline:
+                return
+
+            scenario = rng.choices(self.scenarios, self.weights)[0]
+            try:
+                (data, _, _) = SCENARIOS[scenario](self, rng)
+                status = data['status_code']
+            except Exception as err:
+                status = type(err).__name__
+            stats.record(scenario, (time.perf_counter() - sent) * 1e6, status)
+
+    def run(self):
+        """Run the load and return its report dict"""
+        self.users_api = Users(self.url, **self.api_kwargs)
+        self.todos_api = Todos(self.url, **self.api_kwargs)
+        stats = [_WorkerStats() for _ in range(self.concurrency)]
+        start = time.perf_counter()
+        try:
+            threads = [threading.Thread(target=self._worker, \
+                args=(index, start, stats[index]), daemon=True) \
+                for index in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.users_api.close()
+            self.todos_api.close()
+        elapsed = time.perf_counter() - start
+
+        return self._report(stats, elapsed)
+
+    def _report(self, stats, elapsed):
+        latency = {}
+        statuses = {}
+        for worker in stats:
+            for scenario, histogram in worker.latency.items():
+                latency.setdefault(scenario, Histogram()).merge(histogram)
+                statuses.setdefault(scenario, Counter()).update(
+                    worker.statuses[scenario])
+        total_latency = Histogram()
+        total_statuses = Counter()
+        for scenario in latency:
+            total_latency.merge(latency[scenario])
+            total_statuses.update(statuses[scenario])
+
+        def section(histogram, status_counts):
+            errors = sum(count for status, count in status_counts.items() \
+                if not (isinstance(status, int) and 200 <= status < 300))
+            summary = {name: (value / 1000 if value is not None and \
+                name != 'count' else value) for name, value in \
+                histogram.summary().items()}
+            return {
+                'requests': histogram.count,
+                'throughput': histogram.count / elapsed if elapsed else 0,
+                'latency_ms': summary,
+                'error_rate': errors / histogram.count if histogram.count \
+                    else 0,
+                'status_codes': {str(status): count for status, count in \
+                    sorted(status_counts.items(), key=str)},
+            }
+
+        return {
+            'url': self.url,
+            'duration': elapsed,
+            'concurrency': self.concurrency,
+            'target_rps': self.rps,
+            'total': section(total_latency, total_statuses),
+            'scenarios': {scenario: section(latency[scenario], \
+                statuses[scenario]) for scenario in sorted(latency)},
+        }
+
+
+def print_report(report):
+    """Print a load report"""
+    rows = [('total', report['total'])] + list(report['scenarios'].items())
+    for name, section in rows:
+        latency = section['latency_ms']
+        line = f"{name}: {section['requests']} requests, " \
+            f"{section['throughput']:.1f} req/s, " \
+            f"p50 {latency['p50']} ms, p90 {latency['p90']} ms, " \
+            f"p99 {latency['p99']} ms, p999 {latency['p999']} ms, " \
+            f"errors {section['error_rate']:.2%} {section['status_codes']}"
+        if section['error_rate']:
+            print_err(line)
+        else:
+            print_info(line)
+
+
+def _weight(text):
+    (name, _, weight) = text.partition('=')
+    return (name, float(weight or 1))
+
+
+def main(argv=None):
+    from testcases.rest.rest_constants import fancode_url
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--url', default=fancode_url)
+    parser.add_argument('--scenario', type=_weight, action='append', \
+        help='Scenario and weight, e.g. get_user=4 (repeatable)')
+    parser.add_argument('--rps', type=float, \
+        help='Target requests per second, closed loop if not given')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--users', type=int, default=10, \
+        help='Number of users for get_user ids')
+    parser.add_argument('--todos', type=int, default=200, \
+        help='Number of todos for get_todo ids')
+    parser.add_argument('--json', help='Write the report to this file')
+    args = parser.parse_args(argv)
+
+    generator = LoadGenerator(args.url, \
+        dict(args.scenario) if args.scenario else None, args.rps, \
+        args.concurrency, args.duration, (1, args.users), (1, args.todos))
+    report = generator.run()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+    return 1 if report['total']['error_rate'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,11 +5,6 @@
 All API's are seperated in following different sections.
 Search them before adding anything, and add a new section for new API's.
 """
-import sys
-from os.path import abspath, dirname, join
-
-if not abspath(join(dirname(__file__), '../../')) in sys.path:
-    sys.path.insert(0, abspath(join(dirname(__file__), '../../')))
 
 from lib.common.reportlib import module_report
 
@@ -42,6 +37,19 @@ def create_user(users_api, payload, verify=True, verify_count=True, \
     if result:
         return data['json_data']
 
+def create_users(users_api, payloads, verify=True, verify_count=True, \
+        should_pass=True, message=None):
+    """Create users concurrently, reported per user"""
+    created = []
+    for ((data, errors, result), payload) in zip( \
+            users_api.create_users(payloads, verify, verify_count), payloads):
+        module_report(data, errors, result, payload['username'], 'User', \
+            'Create', should_pass, message)
+
+        if result:
+            created.append(data['json_data'])
+    return created
+
 #################################### TODOS ####################################
 def list_todos(todos_api, params={}, should_pass=True):
     """Get list of todos"""
@@ -5,40 +5,73 @@
 Defines wrappers over todos related REST API
 """
 import sys
-from os.path import abspath, dirname, join
 
-if not abspath(join(dirname(__file__), '../../')) in sys.path:
-    sys.path.insert(0, abspath(join(dirname(__file__), '../../')))
-
-from lib.executors.restapilib import RestAPICall
+from lib.executors.restapilib import RestAPICall, AsyncRestAPICall, \
+    DEFAULT_CONCURRENCY, COUNT_PARAMS, DEFAULT_PAGE_SIZE
 from lib.common.reportlib import status_code_err, print_err, print_debug, \
     print_pretty
+from lib.common.utilitylib import total_count_from_headers, iter_pages, \
+    run_flow, arun_flow
+
+
+def _total_todos_flow(params):
+    """Flow of _total_todos, see run_flow()
+
+    Reads the total count header of a single todo page and lists all todos
+    only when the server doesn't send it.
+    """
+    response = None
+    try:
+        (data, _, result) = yield ('list_todos', \
+            (dict(params, **COUNT_PARAMS),))
+        count = total_count_from_headers(data['headers']) if result else None
+        if count is not None:
+            return count
+
+        response = (yield ('list_todos', (params,)))[0]['json_data']
+        return len(response)
+    except Exception:
+        print_err("Failed to get total todos from list todos API.")
+        print_debug("API Response:")
+        print_pretty(response)
+        sys.exit(1)
+
 
 class Todos():
     """
     Todos API
     """
 
-    def __init__(self, url):
+    def __init__(self, url, **kwargs):
         """Create an instance of RESTful API Interface
         
         Args:
             url: The base URL of the API.
+            kwargs: RestAPICall options (transport, pool_size, session etc.)
+                Pass transport='shared' to share one connection pool between
+                objects pointing at the same base URL.
     
         """
         self.major_uri = '/todos'
-        self.api = RestAPICall(url)
+        self.api = RestAPICall(url, **kwargs)
+
+    def close(self):
+        """Release connections held by the API interface"""
+        self.api.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def _total_todos(self, params={}):
-        """Get total numbers of todos."""
-        try:
-            response = self.list_todos(params)[0]['json_data']
-            return len(response)
-        except Exception:
-            print_err("Failed to get total todos from list todos API.")
-            print_debug("API Response:")
-            print_pretty(response)
-            sys.exit(1)
+        """Get total numbers of todos.
+
+        Reads the total count header of a single todo page and lists all
+        todos only when the server doesn't send it.
+        """
+        return run_flow(_total_todos_flow(params), self)
 
     def list_todos(self, params={}):
         """List Todos API
@@ -61,6 +94,56 @@ class Todos():
         
         return (data, '', True)
     
+    def iter_todos(self, params={}, page_size=DEFAULT_PAGE_SIZE, \
+        prefetch=True):
+        """Iterate over todos page by page
+        EP:
+            GET /todos?_page={page}&_limit={page_size}
+
+        Args:
+            params: Filteration params
+            page_size: Number of todos per page
+            prefetch: Fetch next page while the current one is consumed
+
+        Yields:
+            Todo dicts
+        """
+        def fetch_page(page):
+            (data, err, result) = self.list_todos(
+                dict(params, _page=page, _limit=page_size))
+            if not result:
+                print_err(f"Failed to list todos page {page}.")
+                print_debug(err)
+                sys.exit(1)
+            return (data['json_data'], \
+                total_count_from_headers(data['headers']))
+
+        return iter_pages(fetch_page, page_size, prefetch)
+
+    def stream_todos(self, params={}):
+        """Stream todos of a single list response
+        EP:
+            GET /todos
+
+        The JSON array is decoded incrementally, todos are yielded while the
+        rest of the body is still being downloaded.
+
+        Args:
+            params: Filteration params
+
+        Yields:
+            Todo dicts
+        """
+        data = self.api.get(self.major_uri, params=params, stream=True)
+        if not data['status_code'] == 200:
+            # Release the connection of the unread body
+            data.http_response.close()
+            print_err("Failed to list todos.")
+            print_debug(status_code_err())
+            sys.exit(1)
+
+        yield from data.iter_json()
+
     def get_todo(self, todo_id):
         """Get Todo
 
@@ -81,3 +164,60 @@ class Todos():
             return (data, err, False)
         
         return (data, '', True)
+
+
+class AsyncTodos():
+    """
+    Todos API for asyncio event loops
+    """
+
+    def __init__(self, url, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+        """Create an instance of asyncio RESTful API Interface
+
+        Args:
+            url: The base URL of the API.
+            concurrency: Maximum number of requests in flight at a time
+            kwargs: RestAPICall options
+
+        """
+        self.major_uri = '/todos'
+        self.api = AsyncRestAPICall(url, concurrency, **kwargs)
+
+    def close(self):
+        """Release worker threads and connections"""
+        self.api.close()
+
+    async def aclose(self):
+        """Release worker threads and connections without blocking the loop"""
+        await self.api.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def _total_todos(self, params={}):
+        """Get total numbers of todos, see Todos._total_todos"""
+        return await arun_flow(_total_todos_flow(params), self)
+
+    async def list_todos(self, params={}):
+        """List Todos API, see Todos.list_todos"""
+        data = await self.api.get(self.major_uri, params=params)
+
+        if not data['status_code'] == 200:
+            err = status_code_err()
+            return (data, err, False)
+
+        return (data, '', True)
+
+    async def get_todo(self, todo_id):
+        """Get Todo, see Todos.get_todo"""
+        uri = f"{self.major_uri}/{todo_id}"
+        data = await self.api.get(uri)
+
+        if not data['status_code'] == 200:
+            err = status_code_err()
+            return (data, err, False)
+
+        return (data, '', True)
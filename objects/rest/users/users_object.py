@@ -5,40 +5,201 @@
 Defines wrappers over user related REST API
 """
 import sys
-from os.path import abspath, dirname, join
 
-if not abspath(join(dirname(__file__), '../../')) in sys.path:
-    sys.path.insert(0, abspath(join(dirname(__file__), '../../')))
-
-from lib.executors.restapilib import RestAPICall
+from lib.executors.restapilib import RestAPICall, AsyncRestAPICall, \
+    DEFAULT_CONCURRENCY, COUNT_PARAMS, DEFAULT_PAGE_SIZE
 from lib.common.reportlib import status_code_err, print_err, print_debug, \
     print_pretty, count_err, get_err
-from lib.common.utilitylib import compare_dicts
+from lib.common.utilitylib import compare_dicts, total_count_from_headers, \
+    iter_pages, reconcile_records, format_diffs, run_flow, arun_flow
+
+# Most ids fetched with a single id filtered list call while verifying created
+# users, more are verified against the full list
+BULK_VERIFY_IDS = 100
+
+
+def _bulk_verify_params(user_ids):
+    """Return list params of the single fetch verifying created users"""
+    if len(user_ids) <= BULK_VERIFY_IDS:
+        return {'id': list(user_ids)}
+    return {}
+
+
+def _expected_user(payload, user_id):
+    """Return user record expected to be fetched after posting payload"""
+    return dict(payload, id=user_id)
+
+
+def _verify_created_users(results, payloads, previous_count, new_count, \
+    listed_users):
+    """Verify users created by create_users against one count and one fetch
+
+    Args:
+        results: List of (data, errors, result) of the posts, updated in place
+        payloads: User dicts posted, in order of results
+        previous_count: Total users before the posts, None to skip
+        new_count: Total users after the posts
+        listed_users: Users of the bulk fetch, None to skip
+
+    Returns:
+        results
+    """
+    created = sum(1 for (_, _, result) in results if result)
+    if previous_count is not None and \
+            not new_count == previous_count + created:
+        err = count_err(new_count, previous_count + created)
+        for (index, (data, _, result)) in enumerate(results):
+            if result:
+                results[index] = (data, err, False)
+
+    if listed_users is None:
+        return results
+
+    expected = {}
+    for ((data, _, result), payload) in zip(results, payloads):
+        if result:
+            user_id = data['json_data']['id']
+            expected[user_id] = _expected_user(payload, user_id)
+    reconciled = reconcile_records(expected.values(), listed_users, \
+        partial=True)
+    missing = set(reconciled['missing'])
+
+    for (index, (data, _, result)) in enumerate(results):
+        if not result:
+            continue
+        user_id = data['json_data']['id']
+        if user_id in missing:
+            results[index] = (data, get_err('user', 'user_id', user_id), \
+                False)
+        elif user_id in reconciled['mismatched']:
+            errors = print_err(format_diffs( \
+                reconciled['mismatched'][user_id], 'User dict', \
+                'Response dict'), p=False)
+            results[index] = (data, errors, False)
+    return results
+
+
+def _total_users_flow():
+    """Flow of _total_users, see run_flow()
+
+    Reads the total count header of a single user page and lists all users
+    only when the server doesn't send it.
+    """
+    response = None
+    try:
+        (data, _, result) = yield ('list_users', (COUNT_PARAMS,))
+        count = total_count_from_headers(data['headers']) if result \
+            else None
+        if count is not None:
+            return count
+
+        response = (yield ('list_users', ()))[0]['json_data']
+        return len(response)
+    except Exception:
+        print_err("Failed to get total users from list users API.")
+        print_debug("API Response:")
+        print_pretty(response)
+        sys.exit(1)
+
+
+def _create_user_flow(payload, verify, verify_count):
+    """Flow of create_user, see run_flow()"""
+    if verify_count:
+        previous_count = yield ('_total_users', ())
+
+    (data, err, result) = yield ('_post_user', (payload,))
+    if not result:
+        return (data, err, False)
+
+    if verify_count:
+        # Verify total count after creation of user
+        new_count = yield ('_total_users', ())
+        if not new_count == previous_count + 1:
+            err = count_err(new_count, previous_count + 1)
+            return (data, err, False)
+
+    if verify:
+        # Verify successful get operation on user after creation
+        user_id = data['json_data']['id']
+        (response, err, result) = yield ('get_user', (user_id,))
+        if not result:
+            err = get_err('user', 'user_id', user_id)
+            return (data, err, False)
+
+        # compare and verify dictonaries in input payload and output data
+        user_details = response['json_data']
+        ignore_keys = []
+        errors = compare_dicts(_expected_user(payload, user_id), \
+                    user_details, 'User dict', 'Response dict', ignore_keys)
+
+        if errors:
+            return (data, errors, False)
+
+    return (data, '', True)
+
+
+def _create_users_flow(payloads, verify, verify_count, concurrency):
+    """Flow of create_users, see run_flow()"""
+    previous_count = (yield ('_total_users', ())) if verify_count else None
+
+    results = yield ('_post_users', (payloads, concurrency))
+    if not any(result for (_, _, result) in results):
+        return results
+
+    new_count = (yield ('_total_users', ())) if verify_count else None
+    listed_users = None
+    if verify:
+        user_ids = [data['json_data']['id'] \
+            for (data, _, result) in results if result]
+        (response, _, result) = yield ('list_users', \
+            (_bulk_verify_params(user_ids),))
+        listed_users = response['json_data'] if result else []
+
+    return _verify_created_users(results, payloads, previous_count, \
+        new_count, listed_users)
+
+
+def _post_result(data):
+    """Return (data, errors, result) of a user post"""
+    if not data['status_code'] == 201:
+        return (data, status_code_err(), False)
+    return (data, '', True)
+
 
 class Users():
     """Users API
     """
 
-    def __init__(self, url):
+    def __init__(self, url, **kwargs):
         """Create an instance of RESTful API Interface
         
         Args:
             url: The base URL of the API.
+            kwargs: RestAPICall options (transport, pool_size, session etc.)
+                Pass transport='shared' to share one connection pool between
+                objects pointing at the same base URL.
     
         """
         self.major_uri = '/users'
-        self.api = RestAPICall(url)
+        self.api = RestAPICall(url, **kwargs)
+
+    def close(self):
+        """Release connections held by the API interface"""
+        self.api.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def _total_users(self):
-        """Get total numbers of users."""
-        try:
-            response = self.list_users()[0]['json_data']
-            return len(response)
-        except Exception:
-            print_err("Failed to get total users from list users API.")
-            print_debug("API Response:")
-            print_pretty(response)
-            sys.exit(1)
+        """Get total numbers of users.
+
+        Reads the total count header of a single user page and lists all
+        users only when the server doesn't send it.
+        """
+        return run_flow(_total_users_flow(), self)
 
     def list_users(self, params={}):
         """List users API
@@ -60,6 +221,56 @@ class Users():
         
         return (data, '', True)
     
+    def iter_users(self, params={}, page_size=DEFAULT_PAGE_SIZE, \
+        prefetch=True):
+        """Iterate over users page by page
+        EP:
+            GET /users?_page={page}&_limit={page_size}
+
+        Args:
+            params: Filteration params
+            page_size: Number of users per page
+            prefetch: Fetch next page while the current one is consumed
+
+        Yields:
+            User dicts
+        """
+        def fetch_page(page):
+            (data, err, result) = self.list_users(
+                dict(params, _page=page, _limit=page_size))
+            if not result:
+                print_err(f"Failed to list users page {page}.")
+                print_debug(err)
+                sys.exit(1)
+            return (data['json_data'], \
+                total_count_from_headers(data['headers']))
+
+        return iter_pages(fetch_page, page_size, prefetch)
+
+    def stream_users(self, params={}):
+        """Stream users of a single list response
+        EP:
+            GET /users
+
+        The JSON array is decoded incrementally, users are yielded while the
+        rest of the body is still being downloaded.
+
+        Args:
+            params: Filteration params
+
+        Yields:
+            User dicts
+        """
+        data = self.api.get(self.major_uri, params=params, stream=True)
+        if not data['status_code'] == 200:
+            # Release the connection of the unread body
+            data.http_response.close()
+            print_err("Failed to list users.")
+            print_debug(status_code_err())
+            sys.exit(1)
+
+        yield from data.iter_json()
+
     def get_user(self, user_id):
         """Get User
 
@@ -96,37 +307,120 @@ class Users():
             Tuple of response of paginated API, errors & boolean result of 
             operations
         """
-        if verify_count:
-            previous_count = self._total_users()
-        
-        data = self.api.post(self.major_uri, payload)
+        return run_flow(_create_user_flow(payload, verify, verify_count), \
+            self)
+
+    def create_users(self, payloads, verify=True, verify_count=True, \
+        concurrency=None):
+        """Create users API, posts concurrently
+
+        The total count is verified once for the whole batch and created
+        users are verified with a single list call instead of a get per user.
+
+        EP:
+            POST /users
+
+        Args:
+            payloads: List of user dicts
+            verify: Verification flag
+            verify_count: User count verification flag
+            concurrency: Number of posts in flight at a time, defaults to the
+                connection pool size
 
-        if not data['status_code'] == 201:
+        Returns:
+            List of tuples of response, errors & boolean result of
+            operations, one per payload in order
+        """
+        return run_flow(_create_users_flow(payloads, verify, verify_count, \
+            concurrency), self)
+
+    def _post_user(self, payload):
+        """Post a user, return (data, errors, result)"""
+        return _post_result(self.api.post(self.major_uri, payload))
+
+    def _post_users(self, payloads, concurrency=None):
+        """Post users on a thread pool, results in order of payloads"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        workers = max(1, min(len(payloads), concurrency or self.api.pool_size))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._post_user, payloads))
+
+
+class AsyncUsers():
+    """Users API for asyncio event loops
+    """
+
+    def __init__(self, url, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+        """Create an instance of asyncio RESTful API Interface
+
+        Args:
+            url: The base URL of the API.
+            concurrency: Maximum number of requests in flight at a time
+            kwargs: RestAPICall options
+
+        """
+        self.major_uri = '/users'
+        self.api = AsyncRestAPICall(url, concurrency, **kwargs)
+
+    def close(self):
+        """Release worker threads and connections"""
+        self.api.close()
+
+    async def aclose(self):
+        """Release worker threads and connections without blocking the loop"""
+        await self.api.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def _total_users(self):
+        """Get total numbers of users, see Users._total_users"""
+        return await arun_flow(_total_users_flow(), self)
+
+    async def list_users(self, params={}):
+        """List users API, see Users.list_users"""
+        data = await self.api.get(self.major_uri, params=params)
+
+        if not data['status_code'] == 200:
             err = status_code_err()
             return (data, err, False)
-        
-        if verify_count:
-            # Verify total count after creation of user
-            new_count = self._total_users()
-            if not new_count == previous_count + 1:
-                err = count_err(new_count, previous_count + 1)
-                return (data, err, False)
-            
-        if verify:
-            # Verify successful get operation on user after creation
-            user_id = data['json_data']['id']
-            (response, err, result) = self.get_user(user_id)
-            if not result:
-                err = get_err('user', 'user_id', user_id)
-                return (data, err, False)
-            
-            # compare and verify dictonaries in input payload and output data
-            user_details = response['json_data']
-            ignore_keys = []
-            errors = compare_dicts(payload, user_details, 'User dict', \
-                        'Response dict', ignore_keys)
-            
-            if errors:
-                return (data, errors, False)
-        
+
         return (data, '', True)
+
+    async def get_user(self, user_id):
+        """Get User, see Users.get_user"""
+        uri = f"{self.major_uri}/{user_id}"
+        data = await self.api.get(uri)
+
+        if not data['status_code'] == 200:
+            err = status_code_err()
+            return (data, err, False)
+
+        return (data, '', True)
+
+    async def create_user(self, payload, verify=True, verify_count=True):
+        """Create user API, see Users.create_user"""
+        return await arun_flow(_create_user_flow(payload, verify, \
+            verify_count), self)
+
+    async def create_users(self, payloads, verify=True, verify_count=True):
+        """Create users API, posts concurrently, see Users.create_users"""
+        return await arun_flow(_create_users_flow(payloads, verify, \
+            verify_count, None), self)
+
+    async def _post_user(self, payload):
+        """Post a user, return (data, errors, result)"""
+        return _post_result(await self.api.post(self.major_uri, payload))
+
+    async def _post_users(self, payloads, concurrency=None):
+        """Post users concurrently, results in order of payloads
+
+        Posts in flight are bounded by the concurrency of the API object.
+        """
+        import asyncio
+        return list(await asyncio.gather(
+            *[self._post_user(payload) for payload in payloads]))
@@ -7,6 +7,7 @@ EP:
 
 Author: Amol More
 """
+import os
 import sys
 from os.path import abspath, dirname, join
 
@@ -23,6 +24,10 @@ from testcases.rest.rest_constants import fancode_url
 failed_users = list()
 no_tasks_users = list()
 
+# If BULK_MODE is set to 1, todos of all users are fetched with one request.
+# If BULK_MODE is set to 0, todos are counted with two requests per user.
+BULK_MODE = int(os.getenv('BULK_MODE', 1))
+
 if __name__ == "__main__":
     
     """Step 1. List users."""
@@ -38,9 +43,17 @@ if __name__ == "__main__":
     # todos api
     todos_api = Todos(fancode_url)
 
+    if BULK_MODE:
+        percentages = core_modules.calculate_users_task_completion_percentage(
+            todos_api, [user['id'] for user in users_from_fancode_city])
+
     for user in users_from_fancode_city:
-        percentage = core_modules.calculate_user_task_completion_percentage(
-            todos_api, user['id'])
+        if BULK_MODE:
+            percentage = percentages[user['id']]
+        else:
+            percentage = \
+                core_modules.calculate_user_task_completion_percentage(
+                    todos_api, user['id'])
 
         """Step 4. Save list of users who have no tasks."""
         if percentage is None:
@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+"""Parallel test runner
+
+Discovers the testcase and usecase scripts and runs them on a pool of warm
+worker processes. Each script runs as __main__ in its own namespace, a
+sys.exit(1) from module_report fails only that script. Results are printed
+and optionally written as JUnit XML and JSON summaries. With --results every
+module_report verification is recorded to a JSON-lines file and summarized.
+With CASSETTE set, workers record to (or replay from) one shared cassette.
+
+Settings, shared sessions and the retry budget are reset after every script,
+so a warm worker runs each script as a fresh process would. Cassette cursors
+aren't: calls with the same key replay in recorded order across scripts, so
+record and replay a cassette with -j 1 for scripts to run in the same order.
+
+Usage:
+    python3 testcases/runner.py [-j WORKERS] [--junit FILE] [--json FILE]
+        [--results FILE] [paths ...]
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import time
+import traceback
+from os.path import abspath, dirname, join, isdir, relpath
+from xml.etree import ElementTree
+
+ROOT = abspath(join(dirname(__file__), '../'))
+if not ROOT in sys.path:
+    sys.path.insert(0, ROOT)
+
+from lib.common import codeclib, reportlib, resultlib
+from lib.executors import cassettelib, restapilib, retrylib
+from lib.common.reportlib import print_info, print_err, print_warning, \
+    print_plain, flush
+
+# Script folders run by default
+DEFAULT_PATHS = [
+    join(ROOT, 'testcases/rest/testcases'),
+    join(ROOT, 'testcases/rest/usecases'),
+]
+
+# Modules imported once per worker instead of once per script
+WARM_MODULES = [
+    'requests',
+    'lib.common.reportlib',
+    'lib.common.utilitylib',
+    'lib.executors.restapilib',
+    'lib.modules.rest.modules',
+    'lib.modules.rest.core_modules',
+    'objects.rest.users.users_object',
+    'objects.rest.todos.todos_object',
+    'testcases.rest.rest_constants',
+]
+
+# Module settings scripts may change, restored after every script
+SCRIPT_SETTINGS = {
+    reportlib: ('DEBUG_FLAG', 'CURL_MODE', 'LOG_LEVEL', 'LOG_COLOR'),
+    codeclib: ('JSON_CODEC',),
+}
+
+
+def discover(paths):
+    """Return sorted list of test scripts under given files and folders"""
+    scripts = set()
+    for path in paths:
+        path = abspath(path)
+        if not isdir(path):
+            scripts.add(path)
+            continue
+        for folder, _, files in os.walk(path):
+            for name in files:
+                if name.endswith('.py') and not name.startswith('_'):
+                    scripts.add(join(folder, name))
+    return sorted(scripts)
+
+
+def _warm_up():
+    """Worker initializer, import the framework once"""
+    for module in WARM_MODULES:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+
+def _reset_state(settings):
+    """Undo module level state a script left behind in a warm worker"""
+    for (module, values) in settings.items():
+        for (name, value) in values.items():
+            setattr(module, name, value)
+    codeclib.get_codec.cache_clear()
+    restapilib.close_shared_sessions()
+    retrylib.DEFAULT_BUDGET.reset()
+
+
+def run_script(script):
+    """Run a test script as __main__ and return its result dict"""
+    settings = {module: {name: getattr(module, name) for name in names} \
+        for (module, names) in SCRIPT_SETTINGS.items()}
+    output = io.StringIO()
+    status = 'passed'
+    message = ''
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output), \
+            contextlib.redirect_stderr(output):
+        try:
+            runpy.run_path(script, run_name='__main__')
+        except SystemExit as exit:
+            if exit.code not in (None, 0):
+                status = 'failed'
+                message = f"Exited with status {exit.code}"
+        except BaseException:
+            status = 'error'
+            message = traceback.format_exc()
+        # Queued report text still targets the captured output
+        flush()
+        _reset_state(settings)
+
+    return {
+        'name': relpath(script, ROOT),
+        'status': status,
+        'time': time.perf_counter() - start,
+        'message': message,
+        'output': output.getvalue(),
+    }
+
+
+def write_junit(results, path, wall_time):
+    """Write results as JUnit XML"""
+    suite = ElementTree.Element('testsuite', {
+        'name': 'fancode_automate',
+        'tests': str(len(results)),
+        'failures': str(sum(r['status'] == 'failed' for r in results)),
+        'errors': str(sum(r['status'] == 'error' for r in results)),
+        'time': f"{wall_time:.3f}",
+    })
+    for result in results:
+        case = ElementTree.SubElement(suite, 'testcase', {
+            'classname': dirname(result['name']).replace(os.sep, '.'),
+            'name': result['name'],
+            'time': f"{result['time']:.3f}",
+        })
+        if result['status'] != 'passed':
+            tag = 'failure' if result['status'] == 'failed' else 'error'
+            ElementTree.SubElement(case, tag, {'message': \
+                result['message'].splitlines()[-1] if result['message'] \
+                else ''}).text = result['message']
+        ElementTree.SubElement(case, 'system-out').text = result['output']
+    ElementTree.ElementTree(suite).write(path, encoding='utf-8', \
+        xml_declaration=True)
+
+
+def write_json(results, path, wall_time):
+    """Write results as JSON summary"""
+    summary = {
+        'tests': len(results),
+        'passed': sum(r['status'] == 'passed' for r in results),
+        'failed': sum(r['status'] == 'failed' for r in results),
+        'errors': sum(r['status'] == 'error' for r in results),
+        'time': wall_time,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=4)
+
+
+def print_result_summary(summary):
+    """Print summary of the recorded module_report results"""
+    print_info(f"{summary['total']} operations verified: " + ', '.join( \
+        f"{count} {status}" for status, count in summary['status'].items()))
+    for operation, statuses in sorted(summary['operations'].items()):
+        print_plain(f"  {operation}: " + ', '.join( \
+            f"{count} {status}" for status, count in statuses.items()))
+    if summary['slowest']:
+        print_plain("  slowest:")
+        for record in summary['slowest']:
+            print_plain(f"    {record['ms']:.2f}ms {record['op']} " \
+                f"{record['type']} [{record['obj']}] {record['status']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS, \
+        help='Test scripts or folders')
+    parser.add_argument('-j', '--workers', type=int, \
+        default=multiprocessing.cpu_count(), help='Number of workers')
+    parser.add_argument('--junit', help='JUnit XML report file')
+    parser.add_argument('--json', help='JSON summary file')
+    parser.add_argument('--results', \
+        help='JSON-lines file module_report results are recorded to')
+    parser.add_argument('-v', '--verbose', action='store_true', \
+        help='Print output of passed scripts too')
+    args = parser.parse_args(argv)
+
+    scripts = discover(args.paths)
+    if args.results:
+        # Workers append to the file, start it empty
+        open(args.results, 'w').close()
+        os.environ['RESULT_FILE'] = reportlib.RESULT_FILE = args.results
+
+    if cassettelib.CASSETTE and (cassettelib.CASSETTE_MODE == 'record' or \
+            (cassettelib.CASSETTE_MODE == 'auto' and \
+            not cassettelib.exists(cassettelib.CASSETTE))):
+        # Start the cassette empty, workers append to it
+        for path in (cassettelib.CASSETTE, cassettelib.CASSETTE + '.idx'):
+            open(path, 'wb').close()
+        os.environ['CASSETTE_MODE'] = cassettelib.CASSETTE_MODE = 'append'
+
+    workers = max(1, min(args.workers, len(scripts)))
+    if cassettelib.CASSETTE and workers > 1:
+        print_warning("Cassette replay order is deterministic only " \
+            "with -j 1.")
+
+    start = time.perf_counter()
+    results = []
+    with multiprocessing.Pool(workers, initializer=_warm_up) as pool:
+        for result in pool.imap_unordered(run_script, scripts):
+            results.append(result)
+            if result['status'] == 'passed':
+                print_info(f"PASSED {result['name']} " \
+                    f"({result['time']:.2f}s)")
+                if args.verbose:
+                    print_plain(result['output'])
+            else:
+                print_err(f"{result['status'].upper()} {result['name']} " \
+                    f"({result['time']:.2f}s)")
+                print_plain(result['output'])
+                print_plain(result['message'])
+    wall_time = time.perf_counter() - start
+
+    results.sort(key=lambda result: result['name'])
+    if args.junit:
+        write_junit(results, args.junit, wall_time)
+    if args.json:
+        write_json(results, args.json, wall_time)
+
+    if args.results:
+        print_result_summary(resultlib.summarize_file(args.results))
+
+    failed = [r for r in results if r['status'] != 'passed']
+    print_info(f"{len(results) - len(failed)} passed, {len(failed)} failed " \
+        f"in {wall_time:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+"""Tests of lib.executors.cassettelib"""
+import datetime
+import importlib.util
+import json
+
+import pytest
+import requests
+
+from benchmarks.stand_in_server import start_server
+from lib.common import codeclib
+from lib.executors.cassettelib import Cassette, exchange_key
+from lib.executors.restapilib import RestAPICall
+from lib.executors.retrylib import RetryBudget, RetryPolicy
+
+PAYLOAD = {'name': 'Zoë', 'username': 'zoe', 'address': {'city': 'FanCode'}}
+
+# Backend used for recording, a different one than the json module if any
+RECORD_CODEC = next((name for name in ('orjson', 'msgspec') \
+    if importlib.util.find_spec(name)), 'json')
+
+
+@pytest.fixture
+def use_codec(monkeypatch):
+    def use(name):
+        monkeypatch.setattr(codeclib, 'JSON_CODEC', name)
+        codeclib.get_codec.cache_clear()
+    yield use
+    codeclib.get_codec.cache_clear()
+
+
+def test_key_ignores_payload_form():
+    key = exchange_key('post', 'http://host/users', None, PAYLOAD)
+    assert exchange_key('POST', 'http://host/users', {}, \
+        '{"username": "zoe", "name": "Zo\\u00eb", ' \
+        '"address": {"city": "FanCode"}}') == key
+    assert exchange_key('post', 'http://host/users', None, \
+        dict(PAYLOAD, name='Zoe')) != key
+
+
+def test_replay_under_other_codec_and_threshold(tmp_path, use_codec):
+    path = str(tmp_path / 'users.cassette')
+
+    use_codec(RECORD_CODEC)
+    (server, url) = start_server(users=10, todos=20)
+    try:
+        with Cassette(path, 'record') as cassette:
+            api = RestAPICall(url, cassette=cassette, compress_threshold=1)
+            recorded = api.post('/users', dict(PAYLOAD))
+            recorded_user = api.get('/users/1')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Replayed without the server
+    use_codec('json')
+    with Cassette(path, 'replay') as cassette:
+        api = RestAPICall(url, cassette=cassette)
+        replayed = api.post('/users', dict(PAYLOAD))
+        replayed_user = api.get('/users/1')
+
+    assert replayed['status_code'] == recorded['status_code']
+    assert replayed['json_data'] == recorded['json_data']
+    assert replayed_user['json_data'] == recorded_user['json_data']
+
+
+class FlakySession(object):
+    """requests session stand-in answering 503 before every 200"""
+
+    def __init__(self):
+        self.cookies = {}
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        response = requests.models.Response()
+        response.status_code = 200 if self.calls % 2 == 0 else 503
+        response.reason = 'OK'
+        response.url = url
+        response._content = json.dumps({'call': self.calls}).encode()
+        response._content_consumed = True
+        response.elapsed = datetime.timedelta(0)
+        response.request = requests.Request('GET', url).prepare()
+        return response
+
+
+def test_only_returned_response_is_recorded(tmp_path):
+    path = str(tmp_path / 'retried.cassette')
+    session = FlakySession()
+    retry = RetryPolicy(backoff=0, budget=RetryBudget(min_per_second=100))
+    with Cassette(path, 'record') as cassette:
+        api = RestAPICall('http://host', session=session, retry=retry, \
+            cassette=cassette)
+        assert api.get('/todos/1')['json_data'] == {'call': 2}
+        assert api.get('/todos/1')['json_data'] == {'call': 4}
+    assert session.calls == 4
+
+    # Failed attempts aren't replayed, even without a retry policy
+    with Cassette(path, 'replay') as cassette:
+        api = RestAPICall('http://host', session=FlakySession(), \
+            cassette=cassette)
+        assert [api.get('/todos/1')['json_data'] for _ in range(2)] == \
+            [{'call': 2}, {'call': 4}]
+        assert api.caller.calls == 0
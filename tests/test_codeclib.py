@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+"""Tests of lib.common.codeclib"""
+import importlib.util
+
+import pytest
+
+from lib.common import codeclib
+
+BACKENDS = [name for name in codeclib.CODEC_PREFERENCE \
+    if name == 'json' or importlib.util.find_spec(name)]
+
+DOCUMENTS = [
+    {'id': 1, 'name': 'Zoë', 'tags': ['a', 'b'], 'ratio': 0.5},
+    [{'userId': 1, 'completed': True}, {'userId': 2, 'completed': False}],
+    {'address': {'geo': {'lat': '-37.3159', 'lng': '81.1496'}}, 'x': None},
+    'FanCode ✓',
+    [],
+]
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_dumps_identical_across_backends(document):
+    outputs = {name: codeclib.get_codec(name).dumps(document) \
+        for name in BACKENDS}
+    assert len(set(outputs.values())) == 1, outputs
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_dumps_pretty_identical_across_backends(document):
+    outputs = {name: codeclib.get_codec(name).dumps_pretty(document) \
+        for name in BACKENDS}
+    assert len(set(outputs.values())) == 1, outputs
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_roundtrip(name):
+    codec = codeclib.get_codec(name)
+    for document in DOCUMENTS:
+        assert codec.loads(codec.dumps(document)) == document
@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+"""Tests of lib.common.exportlib"""
+import json
+
+from benchmarks.stand_in_server import start_server
+from lib.common.exportlib import HARSink, JSONLinesSink
+from lib.executors.restapilib import RestAPICall
+
+PAYLOAD = {'name': 'Zoë', 'username': 'zoe'}
+
+
+def post_compressed(sink):
+    (server, url) = start_server(users=10, todos=20)
+    try:
+        with RestAPICall(url, export_sink=sink, compress_threshold=1) as api:
+            data = api.post('/users', dict(PAYLOAD))
+    finally:
+        server.shutdown()
+        server.server_close()
+    sink.close()
+    return data
+
+
+def test_jsonlines_exports_uncompressed_payload(tmp_path):
+    path = tmp_path / 'exchanges.jsonl'
+    data = post_compressed(JSONLinesSink(str(path)))
+    assert data['status_code'] == 201
+
+    (exchange,) = [json.loads(line) for line in path.read_text( \
+        encoding='utf-8').splitlines()]
+    assert json.loads(exchange['request_body']) == PAYLOAD
+    headers = {name.lower() for name in exchange['request_headers']}
+    assert 'content-encoding' not in headers
+    assert 'content-length' not in headers
+    assert 'Content-Encoding' not in exchange['curl']
+    assert exchange['request_body'] in exchange['curl']
+
+
+def test_har_exports_uncompressed_payload(tmp_path):
+    path = tmp_path / 'exchanges.har'
+    post_compressed(HARSink(str(path)))
+
+    (entry,) = json.loads(path.read_text(encoding='utf-8'))['log']['entries']
+    assert json.loads(entry['request']['postData']['text']) == PAYLOAD
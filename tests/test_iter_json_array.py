@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""Tests of lib.common.utilitylib.iter_json_array"""
+import json
+
+import pytest
+
+from lib.common.utilitylib import iter_json_array
+
+VALID = [
+    '[]',
+    ' [ ] ',
+    '[1.5]',
+    '[2e3, -0.5E-2, 10]',
+    '[{"id": 1, "title": "a,]b", "tags": [1, 2]}, "café", true, null]',
+    '\n[\n  {"a": {}},\n  []\n]\n',
+]
+
+INVALID = [
+    '',
+    '{}',
+    '[1 2]',
+    '[1,,2]',
+    '[,1]',
+    '[1,]',
+    '[1,2]garbage',
+    '[1',
+    '[1.]',
+    '[2e]',
+]
+
+
+def splits(document):
+    """Yield the document as two chunks split at every byte offset"""
+    data = document.encode('utf-8')
+    for offset in range(len(data) + 1):
+        yield [data[:offset], data[offset:]]
+
+
+@pytest.mark.parametrize('document', VALID)
+def test_valid_split_at_every_offset(document):
+    expected = json.loads(document)
+    for chunks in splits(document):
+        assert list(iter_json_array(chunks)) == expected, chunks
+
+
+@pytest.mark.parametrize('document', VALID)
+def test_valid_one_byte_chunks(document):
+    data = document.encode('utf-8')
+    chunks = [data[i:i + 1] for i in range(len(data))]
+    assert list(iter_json_array(chunks)) == json.loads(document)
+
+
+@pytest.mark.parametrize('document', INVALID)
+def test_invalid_split_at_every_offset(document):
+    for chunks in splits(document):
+        with pytest.raises(ValueError):
+            list(iter_json_array(chunks))
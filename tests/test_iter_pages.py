@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+"""Tests of lib.common.utilitylib.iter_pages"""
+import pytest
+
+from lib.common.utilitylib import iter_pages
+
+RECORDS = list(range(1, 26))
+
+
+def paged(records, with_total=False):
+    """Fetcher of pages of 10 records"""
+    calls = []
+
+    def fetch_page(page):
+        calls.append(page)
+        page_records = records[(page - 1) * 10:page * 10]
+        return (page_records, len(records)) if with_total else page_records
+    return (fetch_page, calls)
+
+
+def ignoring(records):
+    """Fetcher of a server ignoring the paging params"""
+    calls = []
+
+    def fetch_page(page):
+        calls.append(page)
+        return list(records)
+    return (fetch_page, calls)
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+@pytest.mark.parametrize('with_total', [False, True])
+def test_pages(prefetch, with_total):
+    (fetch_page, calls) = paged(RECORDS, with_total)
+    assert list(iter_pages(fetch_page, 10, prefetch)) == RECORDS
+    assert calls == [1, 2, 3]
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_total_reached_stops_on_full_page(prefetch):
+    (fetch_page, calls) = paged(RECORDS[:20], with_total=True)
+    assert list(iter_pages(fetch_page, 10, prefetch)) == RECORDS[:20]
+    assert calls == [1, 2]
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+@pytest.mark.parametrize('size', [5, 10, 25])
+def test_server_ignoring_paging(prefetch, size):
+    (fetch_page, calls) = ignoring(RECORDS[:size])
+    assert list(iter_pages(fetch_page, 10, prefetch)) == RECORDS[:size]
+    assert len(calls) <= 3
@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+"""Tests of lib.common.reportlib colouring"""
+import io
+
+from lib.common import reportlib
+
+
+class TTY(io.StringIO):
+
+    def __init__(self):
+        super().__init__()
+        self.checks = 0
+
+    def isatty(self):
+        self.checks += 1
+        return True
+
+
+def test_terminal_checked_once(monkeypatch):
+    stdout = TTY()
+    monkeypatch.setattr('sys.stdout', stdout)
+    monkeypatch.setattr(reportlib, 'LOG_COLOR', 'auto')
+    monkeypatch.setattr(reportlib, '_is_tty', None)
+    monkeypatch.setattr(reportlib, '_writer', reportlib._SyncWriter())
+    monkeypatch.setattr(reportlib, 'LOG_LEVEL', reportlib.LOG_LEVELS['debug'])
+    for _ in range(3):
+        reportlib.print_info('message')
+    assert stdout.checks == 1
+    assert stdout.getvalue().count('\033[92m[INFO] message') == 3
+
+    monkeypatch.setattr(reportlib, 'LOG_COLOR', '0')
+    assert not reportlib.use_color()
+
+
+def test_returned_text_uncoloured(monkeypatch):
+    monkeypatch.setattr(reportlib, 'LOG_COLOR', '1')
+    err = reportlib.status_code_err()
+    assert '\033' not in err
+    assert err == reportlib.plain_dict['error'] % \
+        "The API response did not match the expected status code."
+    assert reportlib.colorize(err) == reportlib.beautify_dict['error'] % \
+        "The API response did not match the expected status code."
+
+    monkeypatch.setattr(reportlib, 'LOG_COLOR', '0')
+    assert reportlib.colorize(err) == err
@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""Tests of revalidation of lib.executors.cachelib.ResponseCache entries"""
+import datetime
+import json
+import time
+
+import requests
+
+from lib.executors.cachelib import ResponseCache
+from lib.executors.restapilib import RestAPICall
+
+
+class ETagSession(object):
+    """requests session stand-in answering 304 to a matching If-None-Match"""
+
+    def __init__(self):
+        self.cookies = {}
+        self.sent_headers = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent_headers.append(dict(headers))
+        response = requests.models.Response()
+        if headers.get('If-None-Match') == '"v1"':
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = 200
+            response._content = json.dumps({'id': 1}).encode()
+        response.headers['ETag'] = '"v1"'
+        response.reason = 'OK'
+        response.url = url
+        response._content_consumed = True
+        response.elapsed = datetime.timedelta(0)
+        response.request = requests.Request('GET', url).prepare()
+        return response
+
+
+def test_revalidation_keeps_caller_headers():
+    session = ETagSession()
+    api = RestAPICall('http://host', session=session, \
+        cache=ResponseCache(ttl=0.01))
+    headers = {'X-Trace': '1'}
+    assert api.get('/todos/1', headers=headers)['json_data'] == {'id': 1}
+    time.sleep(0.02)
+
+    data = api.get('/todos/1', headers=headers)
+    assert data['json_data'] == {'id': 1}
+    assert session.sent_headers[1]['If-None-Match'] == '"v1"'
+    assert 'If-None-Match' not in headers
+    assert 'If-None-Match' not in data['input-headers']
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Tests of lib.executors.restapilib.ResponseData"""
+import datetime
+import json
+
+import pytest
+import requests
+
+from lib.common import codeclib
+from lib.common.reportlib import print_pretty
+from lib.executors.restapilib import ResponseData, _UNSET
+
+
+def make_response(body, content_type='application/json'):
+    response = requests.models.Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response.url = 'http://host/todos/1'
+    response.headers = requests.structures.CaseInsensitiveDict( \
+        {'Content-Type': content_type})
+    response._content = body
+    response._content_consumed = True
+    response.elapsed = datetime.timedelta(0)
+    response.request = requests.Request('GET', response.url).prepare()
+    return response
+
+
+@pytest.fixture
+def data():
+    return ResponseData('get', make_response(b'{"id": 1, "title": "a"}'), {})
+
+
+def test_keys_len_and_truth_are_lazy(data):
+    keys = list(data)
+    assert keys == ['url', 'status_code', 'input-headers', 'headers', \
+        'cookies', 'json_data', 'curl', 'timings', 'bytes']
+    assert len(data) == len(keys)
+    assert data
+    assert 'curl' in data and 'payload' not in data
+    assert data._json is _UNSET
+    assert data._curl is _UNSET
+
+
+def test_to_dict_and_serialization(data):
+    plain = data.to_dict()
+    assert type(plain) is dict
+    assert plain['json_data'] == {'id': 1, 'title': 'a'}
+    assert plain == dict(data)
+    assert json.loads(codeclib.dumps(data))['json_data']['id'] == 1
+    assert json.loads(codeclib.dumps([data]))[0]['status_code'] == 200
+    assert json.loads(print_pretty(data, p=False))['curl'] == data['curl']
+
+
+def test_body_keys_listed_once_decoded():
+    data = ResponseData('get', make_response(b'not json', 'text/plain'), {})
+    assert 'text_data' not in list(data)
+    plain = data.to_dict()
+    assert plain['text_data'] == 'not json'
+    assert plain['json_data'] == {}
+    assert 'binary_data' not in plain
+    assert 'text_data' in list(data)
+
+
+def test_copy_keeps_payload_and_lists_decoded_keys():
+    data = ResponseData('post', make_response(b'plain', 'text/plain'), {}, \
+        '{"a": 1}')
+    data['json_data']
+    copy = data.copy()
+    assert copy['payload'] == '{"a": 1}'
+    assert list(copy) == list(data)
@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+"""Tests of lib.common.utilitylib.run_flow and arun_flow"""
+import asyncio
+
+from lib.common.utilitylib import run_flow, arun_flow
+
+
+def flow(values):
+    """Flow adding up the results of two calls, -1 when one fails"""
+    total = 0
+    for value in values:
+        try:
+            total += yield ('double', (value,))
+        except ValueError:
+            return -1
+    return total
+
+
+class Doubler(object):
+
+    def double(self, value):
+        if value < 0:
+            raise ValueError(value)
+        return value * 2
+
+
+class AsyncDoubler(object):
+
+    async def double(self, value):
+        return Doubler().double(value)
+
+
+def test_run_flow():
+    assert run_flow(flow([1, 2]), Doubler()) == 6
+    assert run_flow(flow([1, -2]), Doubler()) == -1
+
+
+def test_arun_flow():
+    assert asyncio.run(arun_flow(flow([1, 2]), AsyncDoubler())) == 6
+    assert asyncio.run(arun_flow(flow([1, -2]), AsyncDoubler())) == -1
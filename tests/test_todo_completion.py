@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+"""Tests of lib.modules.rest.core_modules.TodoCompletionAggregator"""
+from collections import Counter
+
+import pytest
+
+from lib.modules.rest import core_modules
+from lib.modules.rest.core_modules import TodoCompletionAggregator, \
+    aggregate_todo_completion, todo_batch_arrays
+
+IDS = {
+    'dense': [1, 2, 2, 3, 1, 1],
+    'sparse': [1, 1000, 5000000, 1000, 1],
+    'huge': [10 ** 9, 10 ** 9, 1, 10 ** 18],
+    'beyond_int64': [10 ** 20, 1, 10 ** 20],
+    'negative': [-5, 3, -5, 0, -(10 ** 12)],
+    'strings': ['a', 'b', 'a', 'c'],
+    'mixed': [1, 'a', 1, None],
+}
+
+
+def expected(user_ids, completed):
+    """Completion of every user computed with Counter"""
+    total = Counter(user_ids)
+    done = Counter(user_id for (user_id, flag) in zip(user_ids, completed) \
+        if flag)
+    return {user_id: (count, done[user_id], \
+        int((done[user_id] / count) * 100)) for user_id, count in total.items()}
+
+
+def todos(user_ids):
+    return [{'userId': user_id, 'completed': index % 2 == 0} \
+        for index, user_id in enumerate(user_ids)]
+
+
+@pytest.fixture(params=['numpy', 'counter'])
+def vectorized(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(core_modules, '_numpy', lambda: None)
+    return request.param == 'numpy'
+
+
+@pytest.mark.parametrize('name', IDS)
+def test_ids(name, vectorized):
+    user_ids = IDS[name]
+    aggregator = TodoCompletionAggregator()
+    assert aggregator.vectorized == vectorized
+    aggregator.add_todos(todos(user_ids))
+
+    completed = [index % 2 == 0 for index in range(len(user_ids))]
+    assert aggregator.results() == expected(user_ids, completed)
+    for (user_id, (total, done, _)) in expected(user_ids, completed).items():
+        assert aggregator.counts(user_id) == (total, done)
+    assert aggregator.counts('unknown') == (0, 0)
+
+
+def test_batches_share_slots(vectorized):
+    batches = [todo_batch_arrays(todos(IDS['sparse'])), \
+        todo_batch_arrays(todos(IDS['huge'])), \
+        todo_batch_arrays(todos(IDS['sparse']))]
+    user_ids = IDS['sparse'] + IDS['huge'] + IDS['sparse']
+    completed = [index % 2 == 0 for index in range(len(IDS['sparse']))] + \
+        [index % 2 == 0 for index in range(len(IDS['huge']))] + \
+        [index % 2 == 0 for index in range(len(IDS['sparse']))]
+    assert aggregate_todo_completion(batches).results() == \
+        expected(user_ids, completed)